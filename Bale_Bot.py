@@ -1,56 +1,100 @@
-from bale import Bot, Message, Update, InputFile
+from bale import Bot, Message, Update
+from bale.error import APIError, BadRequest, HTTPException, NetworkError, RateLimited, TimeOut
+from bale.request import http as bale_http
+from bale.request.http import Route
 import os
+import json
 from dotenv import load_dotenv
+import aiohttp
 import asyncio
-import re
+import contextlib
+from rate_limiter import get_rate_limiter
+from file_id_cache import get_file_id_cache
+from image_blob import ImageBlob, as_image_blob, image_filename, image_hash, image_size, media_kind, open_image, split_media
+from send_journal import NO_JOURNAL, destination_key
+from instrumentation import get_timings
+from retry_policy import RetryPolicy, FLOOD, TRANSIENT
+from text_splitter import TextSplitter, DEFAULT_CONTINUATION_START, DEFAULT_CONTINUATION_END
 
-# Load environment variables from .env file
-load_dotenv()
+RATE_LIMITED_RETRY_AFTER = 5  # Pause after python-bale-bot gives up on a 429 by itself
 
 class BaleBot:
     MAX_MESSAGE_LENGTH = 950  # Safer limit than 1024
+    MAX_MEDIA_GROUP_SIZE = 10  # Album size limit
 
-    def __init__(self):
+    def __init__(self, chat_id=None):
+        load_dotenv()  # Read .env when a bot is created, not when this module is imported
         self.token = os.getenv("BALE_API_TOKEN")
-        self.chat_id = os.getenv("BALE_CHAT_ID")
+        # BALE_CHAT_ID may list several chats; main.py creates one bot per chat
+        self.chat_id = chat_id or os.getenv("BALE_CHAT_ID", "").split(",")[0].strip()
         if not self.token or not self.chat_id:
             raise ValueError("BALE_API_TOKEN and BALE_CHAT_ID must be set in .env")
-        self.bot = Bot(self.token)
+        self.destination_key = destination_key("bale", self.chat_id)  # What the send journal files deliveries under
+        base_url = os.getenv("BALE_API_BASE_URL")
+        if base_url:
+            bale_http.BALE_API_BASE_URL = base_url  # python-bale-bot reads it for every Route
         self.client = Bot(self.token)
+        self._started = False  # True while a publish job holds the session open
+        self.rate_limiter = get_rate_limiter("bale")
+        self.file_id_cache = get_file_id_cache()
+        self.cache_scope = f"bale:{self.token.split(':')[0]}"  # file_ids belong to one bot
+        self.timings = get_timings()
+        self.retry_policy = RetryPolicy("bale", self.rate_limiter, self._classify_error)
 
         # Continuation messages
-        self.continuation_start = "🔄 این پیام ادامه‌ی پیام قبلی است..."
-        self.continuation_end = "⏳ ادامه در پیام بعدی..."
+        self.continuation_start = DEFAULT_CONTINUATION_START
+        self.continuation_end = DEFAULT_CONTINUATION_END
+        self.splitter = TextSplitter(len, self.continuation_start, self.continuation_end)
 
-    def split_text(self, text, max_length=MAX_MESSAGE_LENGTH):
+    async def start(self):
         """
-        Splits text into smaller chunks, ensuring words are not broken.
-        Adds continuation markers when messages are split.
+        Opens the HTTP session once for a whole publish job, so every message
+        reuses the same keep-alive connection.
         """
-        if len(text) <= max_length:
-            return [text]
+        if not self._started:
+            await self.client.__aenter__()
+            self._started = True
 
-        chunks = []
-        words = text.split(" ")
-        current_chunk = ""
+    async def close(self):
+        if self._started:
+            self._started = False
+            await self.client.close()
 
-        for word in words:
-            if len(current_chunk) + len(word) + 1 > max_length:
-                chunks.append(current_chunk.strip() + f"\n\n{self.continuation_end}")
-                current_chunk = f"{self.continuation_start}\n\n{word}"  # Start new chunk
-            else:
-                current_chunk += " " + word
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @contextlib.asynccontextmanager
+    async def _connection(self):
+        """
+        Yields the shared client. When no job has started the session, it is
+        opened for this call only.
+        """
+        if self._started:
+            yield self.client
+            return
 
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        await self.start()
+        try:
+            yield self.client
+        finally:
+            await self.close()
 
-        return chunks
+    def split_text(self, text, max_length=MAX_MESSAGE_LENGTH):
+        """
+        Splits text into smaller chunks, ensuring words are not broken.
+        Adds continuation markers when messages are split.
+        """
+        return self.splitter.split(text, max_length)
 
     async def run(self, text, photo_path=None):
         """
         Handles sending messages, ensuring long texts are split properly.
         """
-        async with self.client as bot:
+        async with self._connection() as bot:
             try:
                 print(f"Running with text: {text[:30]}...")
                 chunks = self.split_text(text)
@@ -61,77 +105,295 @@ class BaleBot:
                         await self.send_photo_with_caption(bot, chunk, photo_path)
                     else:
                         await self.send_text_message(bot, chunk)
-                    await asyncio.sleep(1)  # Avoid sending too fast
 
             except Exception as e:
                 print(f"Error sending message: {e}")
 
+    async def send_message_with_images(self, text, images, delivery=NO_JOURNAL):
+        """
+        Sends all associated images with their text as a caption to Bale.
+        Several images go out as albums of up to ten photos; an album that is
+        rejected is re-sent photo by photo. If there are no images, only
+        sends the text. Embedded documents and videos follow as their own
+        messages. Parts already recorded in the `delivery` journal are
+        skipped, so an interrupted section resumes where it stopped. Returns
+        True only if every part was delivered.
+        """
+        photos, files = split_media(images)
+        async with self._connection() as bot:
+            if not photos:
+                print(f"Sending text-only: {text}")
+                delivered = True
+                for index, chunk in enumerate(self.split_text(text)):
+                    if await self._send_text_part(bot, delivery, f"text:{index}", chunk) is None:
+                        delivered = False
+            else:
+                delivered = await self._send_photos(bot, text, photos, delivery)
+
+            for index, file in enumerate(files):
+                if await delivery.send(f"file:{index}", lambda: self.send_file(bot, file)) is None:
+                    delivered = False
+        return delivered
+
+    async def _send_photos(self, bot, text, photos, delivery):
+        """
+        Sends the photos as albums, or one by one, with the text as caption.
+        Returns False if a part could not be sent.
+        """
+        image_paths = [photo for photo in map(self._validate_photo, photos) if photo is not None]
+        if not image_paths:
+            return False
+
+        delivered = len(image_paths) == len(photos)
+
+        chunks = self.split_text(text, max_length=1024)
+        caption, remaining_chunks = chunks[0], chunks[1:]
+        for start in range(0, len(image_paths), self.MAX_MEDIA_GROUP_SIZE):
+            group = image_paths[start:start + self.MAX_MEDIA_GROUP_SIZE]
+            if not (len(group) > 1 and await self.send_media_group(bot, caption, group, start, delivery)):
+                for offset, image_path in enumerate(group):
+                    print(f"Sending text: {caption[:30]} with image: {image_path}")
+                    if await delivery.send(
+                        f"photo:{start + offset}",
+                        lambda: self.send_photo_with_caption(bot, caption, image_path),
+                        caption, lambda message_id: self._edit(bot, "editMessageCaption", message_id, "caption", caption),
+                    ) is None:
+                        delivered = False
+                    caption = ""  # Avoid duplicate captions
+
+            for index, chunk in enumerate(remaining_chunks, start=1):
+                if await self._send_text_part(bot, delivery, f"text:{index}", chunk) is None:
+                    delivered = False
+            caption, remaining_chunks = "", []
+        return delivered
+
+    async def send_media_group(self, bot, caption, photo_paths, start=0, delivery=NO_JOURNAL):
+        """
+        Sends several photos as one album with the caption on the first one.
+        Returns False if the album could not be sent, so the caller can fall
+        back to single photos.
+        """
+        part = f"album:{start}"
+        if delivery.is_sent(part) or await delivery.revise(
+            part, caption, lambda message_id: self._edit(bot, "editMessageCaption", message_id, "caption", caption)
+        ):
+            return True
+        if any(delivery.was_sent(f"photo:{start + offset}") for offset in range(len(photo_paths))):
+            return False  # An earlier run fell back to single photos; finish those
+
+        print(f"Sending album of {len(photo_paths)} images with text: {caption[:30]}...")
+        media = []
+        uploads = []  # (form field name, photo) for photos without a cached file_id
+        content_hashes = [image_hash(photo_path) for photo_path in photo_paths]
+        # Waits for images other chats are uploading, claiming in hash order so albums never deadlock
+        file_ids = await self.file_id_cache.claim_many(self.cache_scope, content_hashes)
+        claimed = {content_hash for content_hash, file_id in file_ids.items() if not file_id}
+        for index, (photo_path, content_hash) in enumerate(zip(photo_paths, content_hashes)):
+            name = f"photo{index}"
+            file_id = file_ids[content_hash]
+            item = {"type": "photo", "media": file_id or f"attach://{name}"}
+            if index == 0 and caption:
+                item["caption"] = caption
+            media.append(item)
+            if not file_id:
+                uploads.append((name, photo_path))
+
+        async def attempt():
+            # python-bale-bot has no public wrapper for sendMediaGroup, so use its HTTP client directly.
+            # aiohttp streams file objects in the form, so the photos are opened, never read, per attempt.
+            with contextlib.ExitStack() as stack:
+                form = [
+                    {"name": name, "value": stack.enter_context(open_image(photo)), "filename": image_filename(photo)}
+                    for name, photo in uploads
+                ]
+                return await bot._http.request(
+                    Route("POST", "sendMediaGroup", self.token),
+                    data={"chat_id": self.chat_id, "media": json.dumps(media)},
+                    form=form,
+                )
+
+        try:
+            response = await self.retry_policy.call(self.chat_id, attempt, "bale.sendMediaGroup")
+            self.timings.count("bytes_uploaded", sum(image_size(photo) for _, photo in uploads))
+            delivery.record(part, response.result or [], caption)
+            for content_hash, message in zip(content_hashes, response.result or []):
+                if message.get("photo"):
+                    self.file_id_cache.put(self.cache_scope, content_hash, message["photo"][-1]["file_id"])
+            return True
+        except Exception as e:
+            print(f"Error sending media group, falling back to single photos: {e}")
+            for content_hash in content_hashes:
+                self.file_id_cache.forget(self.cache_scope, content_hash)  # Re-upload in the fallback
+            return False
+        finally:
+            for content_hash in claimed:
+                self.file_id_cache.release(self.cache_scope, content_hash)
+
     async def send_text_message(self, bot, text):
         """
         Sends a text message with flood control handling.
+        Returns the sent message, or None if it could not be sent.
         """
         try:
             print(f"Sending text message: {text[:30]}...")
-            await bot.send_message(chat_id=self.chat_id, text=text)
+            return await self.retry_policy.call(
+                self.chat_id, lambda: bot.send_message(chat_id=self.chat_id, text=text), "bale.sendMessage"
+            )
         except Exception as e:
-            if "Retry in" in str(e):
-                retry_after = self._parse_retry_time(str(e))
-                print(f"Flood control exceeded. Retrying in {retry_after} seconds...")
-                await asyncio.sleep(retry_after)
-                await bot.send_message(chat_id=self.chat_id, text=text)
-            else:
-                print(f"Error sending message: {e}")
+            print(f"Error sending message: {e}")
+
+    async def _send_text_part(self, bot, delivery, part, text):
+        return await delivery.send(
+            part, lambda: self.send_text_message(bot, text),
+            text, lambda message_id: self._edit(bot, "editMessageText", message_id, "text", text),
+        )
+
+    async def _edit(self, bot, method, message_id, field, text):
+        """
+        Replaces the text or caption of a message sent for an earlier
+        revision. python-bale-bot only wraps editMessageText, and parses its
+        result into a Message, so both go through its HTTP client.
+        """
+        route = Route("POST", method, self.token)
+        payload = {"chat_id": self.chat_id, "message_id": message_id, field: text}
+        response = await self.retry_policy.call(
+            self.chat_id, lambda: bot._http.request(route, json=payload), f"bale.{method}"
+        )
+        return response.result
 
     async def send_photo_with_caption(self, bot, text, photo_path):
         """
         Sends a photo with a caption, handling long captions properly.
+        Returns the photo message, or None if it could not be sent.
         """
         try:
             print(f"Sending photo with caption: {text[:30]}...")
-            photo_path = os.path.abspath(photo_path)
-
-            if not os.path.exists(photo_path):
-                print(f"Error: File not found at {photo_path}")
-                return
-            if not os.access(photo_path, os.R_OK):
-                print(f"Error: File not readable at {photo_path}")
-                return
-
-            valid_extensions = (".jpg", ".jpeg", ".png", ".gif")
-            if not photo_path.lower().endswith(valid_extensions):
-                print(f"Error: Invalid file extension for {photo_path}")
+            photo_path = self._validate_photo(photo_path)
+            if photo_path is None:
                 return
 
             chunks = self.split_text(text, max_length=1024)  # Adjust caption length
-
-            with open(photo_path, 'rb') as f:
-                photo = InputFile(f.read())
-                await bot.send_photo(chat_id=self.chat_id, photo=photo, caption=chunks[0])
-
+            message = await self._send_cached(bot, "photo", photo_path, chunks[0])
             for chunk in chunks[1:]:
                 await self.send_text_message(bot, chunk)
+            return message
 
         except Exception as e:
-            if "Retry in" in str(e):
-                retry_after = self._parse_retry_time(str(e))
-                print(f"Flood control exceeded. Retrying in {retry_after} seconds...")
-                await asyncio.sleep(retry_after)
-                await self.send_photo_with_caption(bot, text, photo_path)
-            else:
-                print(f"Error sending photo: {e}")
+            print(f"Error sending photo: {e}")
+
+    async def send_file(self, bot, file):
+        """
+        Sends an embedded video or document (a Word, Excel or PDF file, ...).
+        Returns the message, or None if it could not be sent.
+        """
+        kind = media_kind(file)
+        try:
+            print(f"Sending {kind}: {file}")
+            return await self._send_cached(bot, kind, file)
+        except Exception as e:
+            print(f"Error sending {kind}: {e}")
+
+    async def _send_cached(self, bot, kind, file, caption=None):
+        """
+        Sends a file by file_id when it was uploaded before (or by another
+        chat meanwhile), otherwise uploads it. A file_id Bale no longer
+        accepts is dropped and the file is uploaded again.
+        """
+        content_hash = image_hash(file)
+        file_id = await self.file_id_cache.claim(self.cache_scope, content_hash)
+        try:
+            try:
+                message = await self._send_file(bot, kind, file_id or as_image_blob(file), caption)
+            except (BadRequest, APIError) as e:
+                if not file_id:
+                    raise
+                print(f"Cached file_id rejected, uploading {file} again: {e}")
+                self.file_id_cache.forget(self.cache_scope, content_hash)
+                message = await self._send_file(bot, kind, as_image_blob(file), caption)
+            sent_file = message["photo"][-1] if message.get("photo") else message.get(kind)
+            if sent_file:
+                self.file_id_cache.put(self.cache_scope, content_hash, sent_file["file_id"])
+        finally:
+            if not file_id:
+                self.file_id_cache.release(self.cache_scope, content_hash)  # Wakes chats waiting for it
+        return message
 
-    def _parse_retry_time(self, error_str):
+    async def _send_file(self, bot, kind, file, caption):
         """
-        Extracts the retry time from the error string.
+        Sends one photo, video or document: a file_id, or an ImageBlob that
+        is uploaded. Returns the sent message as a dict. Goes through the
+        HTTP client because python-bale-bot's InputFile reads a whole file
+        into memory; aiohttp streams the opened file instead, reopened for
+        every attempt so a retry never reuses a consumed upload.
         """
-        match = re.search(r"Retry in (\d+)", error_str)
-        return int(match.group(1)) if match else 0
+        async def attempt():
+            with contextlib.ExitStack() as stack:
+                data = {"chat_id": self.chat_id}
+                if caption:
+                    data["caption"] = caption
+                route = Route("POST", f"send{kind.capitalize()}", self.token)
+                if isinstance(file, str):
+                    response = await bot._http.request(route, json={**data, kind: file})
+                else:
+                    stream = stack.enter_context(open_image(file))
+                    form = [{"name": kind, "value": stream, "filename": image_filename(file)}]
+                    response = await bot._http.request(route, data=data, form=form)
+                return response.result
+
+        message = await self.retry_policy.call(self.chat_id, attempt, f"bale.send{kind.capitalize()}")
+        if not isinstance(file, str):
+            self.timings.count("bytes_uploaded", image_size(file))
+        return message
+
+    @staticmethod
+    def _classify_error(error):
+        """
+        Tells the retry policy what to do about a failed call. python-bale-bot
+        already retries a 429 itself (for about 12 seconds) before raising
+        RateLimited, and carries no retry_after, so a fixed pause follows.
+        """
+        if isinstance(error, RateLimited):
+            return FLOOD, RATE_LIMITED_RETRY_AFTER
+        if isinstance(error, HTTPException) and "Form data has been processed" in str(error):
+            # Its own 429 retry re-sent an upload it had already consumed; that was flood control too
+            return FLOOD, RATE_LIMITED_RETRY_AFTER
+        if isinstance(error, (NetworkError, TimeOut)):
+            return TRANSIENT, None
+        if isinstance(error, HTTPException) and isinstance(error.__context__, aiohttp.ClientConnectionError):
+            return TRANSIENT, None  # A dropped connection, which python-bale-bot wraps like any other error
+        # Anything else it wraps in HTTPException (a response it could not decode, a bug) is not retried,
+        # since re-sending could post twice
+        return None
+
+    def _validate_photo(self, photo):
+        """
+        Checks that a photo can be sent. Returns the absolute path (or the
+        ImageBlob itself for in-memory images), or None if it is unusable.
+        """
+        valid_extensions = (".jpg", ".jpeg", ".png", ".gif")
+        if isinstance(photo, ImageBlob):
+            if f".{photo.ext.lower()}" not in valid_extensions:
+                print(f"Error: Invalid image type {photo.content_type} for {photo}")
+                return None
+            return photo
+
+        photo_path = os.path.abspath(photo)
+        if not os.path.exists(photo_path):
+            print(f"Error: File not found at {photo_path}")
+            return None
+        if not os.access(photo_path, os.R_OK):
+            print(f"Error: File not readable at {photo_path}")
+            return None
+        if not photo_path.lower().endswith(valid_extensions):
+            print(f"Error: Invalid file extension for {photo_path}")
+            return None
+        return photo_path
 
-    async def send_batch_messages(self, messages, batch_size=5, delay=1):
+    async def send_batch_messages(self, messages, batch_size=5, delay=0):
         """
         Sends messages in batches to prevent spamming and handles flood control.
         """
-        async with self.client as bot:
+        async with self._connection() as bot:
             for i in range(0, len(messages), batch_size):
                 batch = messages[i:i + batch_size]
                 for message in batch:
@@ -142,12 +404,7 @@ class BaleBot:
                     try:
                         await self.run(text, photo_path)
                         print(f"Message sent: {text[:30]}...")
-                        await asyncio.sleep(delay)  # Add a delay between messages
+                        if delay:
+                            await asyncio.sleep(delay)  # Optional extra gap; the rate limiter paces sends
                     except Exception as e:
-                        if 'Retry in' in str(e):
-                            retry_after = int(str(e).split('Retry in ')[1].split(' ')[0])
-                            print(f"Flood control exceeded. Retrying in {retry_after} seconds...")
-                            await asyncio.sleep(retry_after)
-                            await self.run(text, photo_path)
-                        else:
-                            print(f"Error sending message: {e}")
\ No newline at end of file
+                        print(f"Error sending message: {e}")  # Flood control is retried by the retry policy
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+End-to-end publishing benchmark: generates a bulletin, starts the fake
+Telegram/Bale API server and sends the bulletin through the real bots.
+Nothing is posted anywhere.
+
+Run from the repository root:
+
+    python benchmarks/bench_publish.py --sections 100 --images 2 --image-kb 200 --latency 0.05
+    python benchmarks/bench_publish.py --flood-rate 1 --client-rate 1   # with flood control
+    python benchmarks/bench_publish.py --main                           # also time main.py as a process
+    python benchmarks/bench_publish.py --chats 4                        # mirror to 4 chats per platform
+
+Add --output results.jsonl to append the numbers to a file and track them
+across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from docx_generator import make_bulletin
+from fake_api_server import FakeApiServer
+
+
+def configure_environment(server, work_dir, client_rate, chats=1):
+    """
+    Points the bots at the fake server and keeps every cache and journal
+    inside the benchmark's temporary directory.
+    """
+    environment = {
+        **server.environment(),
+        "TELEGRAM_API_TOKEN": "123456:fake",
+        "TELEGRAM_CHAT_ID": ",".join(str(-1001 - 10 * chat) for chat in range(chats)),
+        "BALE_API_TOKEN": "654321:fake",
+        "BALE_CHAT_ID": ",".join(str(-1002 - 10 * chat) for chat in range(chats)),
+        "TELEGRAM_RATE_LIMIT": str(client_rate),
+        "TELEGRAM_RATE_BURST": "3",
+        "BALE_RATE_LIMIT": str(client_rate),
+        "BALE_RATE_BURST": "1",
+        "FILE_ID_CACHE_PATH": os.path.join(work_dir, "file_id_cache.sqlite3"),
+        "SEND_JOURNAL_PATH": os.path.join(work_dir, "send_journal.sqlite3"),
+        "PARSE_CACHE_DIR": os.path.join(work_dir, "parse_cache"),
+    }
+    os.environ.update(environment)
+    return environment
+
+
+def max_rss_mb(who):
+    if resource is None:
+        return None
+    usage = resource.getrusage(who).ru_maxrss
+    return round(usage / 1024 / (1024 if sys.platform == "darwin" else 1), 1)  # bytes on macOS, KB elsewhere
+
+
+async def publish_in_process(document, choice):
+    from main import build_destinations
+    from parse_cache import ParseCache
+    from publisher import Publisher
+
+    publisher = Publisher(build_destinations(choice))
+    return await publisher.publish(ParseCache().iter_sections(document))
+
+
+def bench_in_process(server, document, choice):
+    from instrumentation import get_timings
+
+    server.reset_stats()
+    started = time.perf_counter()
+    delivered = asyncio.run(publish_in_process(document, choice))
+    elapsed = time.perf_counter() - started
+    get_timings().report()
+    return {"scenario": "in-process", "seconds": round(elapsed, 3), "delivered": delivered,
+            "max_rss_mb": max_rss_mb(resource.RUSAGE_SELF) if resource else None}
+
+
+def bench_main_process(server, document, choice, environment):
+    """
+    Runs `python main.py <document> --to <choice>` as its own process, the
+    way the bulletin desk runs it, including interpreter start-up.
+    """
+    server.reset_stats()
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(REPO_DIR, "main.py"), document, "--to", choice],
+        cwd=os.path.dirname(document), env={**os.environ, **environment}, check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    elapsed = time.perf_counter() - started
+    return {"scenario": "main.py", "seconds": round(elapsed, 3),
+            "max_rss_mb": max_rss_mb(resource.RUSAGE_CHILDREN) if resource else None}
+
+
+def summarize(result, server, sections):
+    stats = {name: dict(values) for name, values in server.stats.items()}
+    calls = sum(values["calls"] for name, values in stats.items() if not name.endswith(".getMe"))
+    result.update({
+        "sections_per_second": round(sections / result["seconds"], 2),
+        "api_calls": calls,
+        "rate_limited": sum(values["rate_limited"] for values in stats.values()),
+        "uploaded_mb": round(sum(values["bytes"] for values in stats.values()) / 1e6, 2),
+        "server": stats,
+    })
+    print(f"\n{result['scenario']}: {result['seconds']:.2f}s, {result['sections_per_second']} sections/s, "
+          f"{calls} API calls, {result['rate_limited']} rate limited, {result['uploaded_mb']} MB uploaded, "
+          f"max RSS {result['max_rss_mb']} MB")
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--sections", type=int, default=100)
+    arg_parser.add_argument("--images", type=int, default=2, help="images per section")
+    arg_parser.add_argument("--image-kb", type=int, default=100)
+    arg_parser.add_argument("--chars", type=int, default=600, help="characters per paragraph")
+    arg_parser.add_argument("--to", choices=["T", "B", "A"], default="A")
+    arg_parser.add_argument("--latency", type=float, default=0.05, help="fake server seconds per request")
+    arg_parser.add_argument("--jitter", type=float, default=0.02)
+    arg_parser.add_argument("--flood-rate", type=float, default=0.0, help="fake server requests/s per chat before 429s")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="share of random 429s")
+    arg_parser.add_argument("--bandwidth", type=float, default=0.0, help="fake server upload cap in MB/s")
+    arg_parser.add_argument("--client-rate", type=float, default=1000.0, help="bots' own messages/s limit")
+    arg_parser.add_argument("--chats", type=int, default=1, help="chats per platform")
+    arg_parser.add_argument("--main", action="store_true", help="also time main.py in a separate process")
+    arg_parser.add_argument("--output", help="append the results to this JSON lines file")
+    args = arg_parser.parse_args()
+
+    server = FakeApiServer(latency=args.latency, jitter=args.jitter, flood_rate=args.flood_rate,
+                           error_rate=args.error_rate, bandwidth=args.bandwidth * 1e6).start_in_thread()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            environment = configure_environment(server, work_dir, args.client_rate, args.chats)
+            document = make_bulletin(os.path.join(work_dir, "bulletin.docx"), args.sections, args.images,
+                                     args.chars, image_kb=args.image_kb)
+            print(f"Bulletin: {args.sections} sections, {args.images} images of ~{args.image_kb} KB each, "
+                  f"{os.path.getsize(document) / 1e6:.1f} MB")
+
+            results.append(summarize(bench_in_process(server, document, args.to), server, args.sections))
+            if args.main:
+                for name in ("file_id_cache.sqlite3", "send_journal.sqlite3"):
+                    path = os.path.join(work_dir, name)
+                    if os.path.exists(path):
+                        os.remove(path)  # Start main.py as cold as the in-process run
+                results.append(summarize(bench_main_process(server, document, args.to, environment), server, args.sections))
+    finally:
+        server.stop_thread()
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps({"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), **result}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Start-up benchmark: how long main.py takes to show its first prompt, and
+what importing each module costs, each measured in fresh processes.
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --exe dist/main/main.exe   # a PyInstaller build
+    python benchmarks/bench_startup.py --runs 20 --output startup.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+FIRST_PROMPT = b"Enter the path"
+MODULES = ["main", "parse_cache", "extract_content_fast", "extract_content", "telegram_bot", "Bale_Bot"]
+
+
+def time_to_prompt(command):
+    """
+    Starts command and returns the seconds until it prints the first prompt.
+    """
+    environment = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=environment, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while FIRST_PROMPT not in output:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError(f"{command} exited before prompting: {output[-200:]!r}")
+            output += chunk
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def time_import(module):
+    """
+    Returns the seconds `import module` takes in a fresh interpreter.
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(name, samples):
+    result = {"name": name, "median_ms": round(statistics.median(samples) * 1000, 1),
+              "min_ms": round(min(samples) * 1000, 1), "runs": len(samples)}
+    print(f"  {name:<28} median {result['median_ms']:8.1f} ms   min {result['min_ms']:8.1f} ms")
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--runs", type=int, default=10)
+    arg_parser.add_argument("--exe", help="also time a built executable to its first prompt")
+    arg_parser.add_argument("--output", help="append the results to this JSON lines file")
+    args = arg_parser.parse_args()
+
+    results = []
+    print("Time to first prompt:")
+    commands = {"python main.py": [sys.executable, os.path.join(REPO_DIR, "main.py")]}
+    if args.exe:
+        commands[os.path.basename(args.exe)] = [os.path.abspath(args.exe)]
+    for name, command in commands.items():
+        time_to_prompt(command)  # Warm the OS file cache; the desk's machines rarely start fully cold either
+        results.append(summarize(name, [time_to_prompt(command) for _ in range(args.runs)]))
+
+    print("Import time:")
+    for module in MODULES:
+        results.append(summarize(f"import {module}", [time_import(module) for _ in range(args.runs)]))
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps({"at": time.strftime("%Y-%m-%dT%H:%M:%S"), **result}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark for text_splitter.TextSplitter on ~1 MB inputs.
+
+Run from the repository root:
+
+    python benchmarks/bench_text_splitter.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_splitter import TextSplitter, utf16_length, DEFAULT_CONTINUATION_START, DEFAULT_CONTINUATION_END
+
+INPUT_SIZE = 1024 * 1024
+PERSIAN_WORDS = ["خبر", "گزارش", "ادامه‌ی", "سازمان", "اقتصادی", "امروز", "جلسه", "نشست", "تهران"]
+EMOJI = ["😀", "🔥", "👨‍👩‍👧", "🇮🇷", "👍🏽"]
+
+
+def legacy_split(text, max_length):
+    """
+    The word-by-word splitter the bots used before text_splitter, kept for comparison.
+    """
+    if len(text) <= max_length:
+        return [text]
+
+    chunks = []
+    current_chunk = ""
+    for word in text.split(" "):
+        if len(current_chunk) + len(word) + 1 > max_length:
+            chunks.append(current_chunk.strip() + f"\n\n{DEFAULT_CONTINUATION_END}")
+            current_chunk = f"{DEFAULT_CONTINUATION_START}\n\n{word}"
+        else:
+            current_chunk += " " + word
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def make_text(kind, size=INPUT_SIZE):
+    random.seed(kind)
+    parts = []
+    length = 0
+    while length < size:
+        if kind == "persian":
+            word = random.choice(PERSIAN_WORDS)
+            word += random.choice([" ", " ", " ", ". ", "\n", "\n\n"])
+        elif kind == "emoji":
+            word = random.choice(PERSIAN_WORDS + EMOJI) + " "
+        else:  # "unbroken": one huge word, the worst case for boundary search
+            word = random.choice(PERSIAN_WORDS)
+        parts.append(word)
+        length += len(word)
+    return "".join(parts)
+
+
+def bench(name, func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:<40} {best * 1000:9.1f} ms  {len(result):6d} chunks")
+    return result
+
+
+def main():
+    telegram = TextSplitter(utf16_length)
+    bale = TextSplitter(len)
+    for kind in ("persian", "emoji", "unbroken"):
+        text = make_text(kind)
+        print(f"\n{kind} input: {len(text)} characters, {utf16_length(text)} UTF-16 units")
+        for max_length in (1024, 4000):
+            chunks = bench(f"telegram split, limit {max_length}", lambda: telegram.split(text, max_length))
+            overflow = sum(1 for chunk in chunks if utf16_length(chunk) > max_length)
+            print(f"{'':<40} {overflow} chunks over the Telegram limit")
+            bench(f"bale split, limit {max_length}", lambda: bale.split(text, max_length))
+            chunks = bench(f"legacy split, limit {max_length}", lambda: legacy_split(text, max_length))
+            overflow = sum(1 for chunk in chunks if utf16_length(chunk) > max_length)
+            print(f"{'':<40} {overflow} legacy chunks over the Telegram limit")
+
+
+if __name__ == "__main__":
+    main()
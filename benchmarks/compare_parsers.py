@@ -0,0 +1,143 @@
+"""
+Checks that FastDocxParser returns exactly what the reference DocxParser
+returns, and times both.
+
+Run from the repository root, on real bulletins and/or a generated one:
+
+    python benchmarks/compare_parsers.py [document.docx ...] [--paragraphs N]
+
+Exits with status 1 if any document parses differently.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from docx.oxml import parse_xml
+from docx_generator import make_png
+from extract_content import DocxParser
+from extract_content_fast import FastDocxParser
+from image_blob import ImageBlob
+
+
+def make_bulletin(path, paragraphs):
+    """
+    Writes a synthetic bulletin with the constructs the parsers must agree
+    on: both heading levels, empty headings, tabs and breaks, hyperlinks,
+    tables, unstyled paragraphs, repeated images and embedded files.
+    """
+    document = Document()
+    images = [make_png(seed) for seed in range(5)]
+    embedded = [
+        Part(PackURI("/word/embeddings/Microsoft_Word_Document1.docx"),
+             "application/vnd.openxmlformats-officedocument.wordprocessingml.document", b"PK embedded", document.part.package),
+        Part(PackURI("/word/embeddings/oleObject1.bin"),
+             "application/vnd.openxmlformats-officedocument.oleObject", b"OLE binary", document.part.package),
+    ]
+    object_xml = (
+        '<w:object xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+        'xmlns:o="urn:schemas-microsoft-com:office:office" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<o:OLEObject Type="Embed" ProgID="Word.Document.12" r:id="{rel_id}"/></w:object>'
+    )
+    hyperlink_xml = (
+        '<w:hyperlink xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" r:id="{rel_id}">'
+        '<w:r><w:t xml:space="preserve"> پیوند {index} </w:t></w:r></w:hyperlink>'
+    )
+    written = 0
+    desk = 0
+    while written < paragraphs:
+        desk += 1
+        document.add_heading(f"دبیرخانه {desk}" if desk % 5 else "", level=1)
+        for story in range(8):
+            document.add_heading(f"خبر {desk}.{story}" if story % 6 else " ", level=4)
+            for line in range(6):
+                paragraph = document.add_paragraph(f"سطر {line} از خبر {story}\tستون")
+                run = paragraph.add_run(" ادامه")
+                if line == 1:
+                    run.add_break()
+                    paragraph.add_run("بعد از شکست خط")
+                elif line == 2:
+                    run.add_break(WD_BREAK.PAGE)
+                elif line == 3:
+                    rel_id = paragraph.part.relate_to("https://example.com", "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink", is_external=True)
+                    paragraph._p.append(parse_xml(hyperlink_xml.format(rel_id=rel_id, index=line)))
+                elif line == 4 and story % 3 == 0:
+                    paragraph.add_run().add_picture(io.BytesIO(images[(desk + story) % len(images)]))
+                elif line == 5 and story % 4 == 1:
+                    rel_id = paragraph.part.relate_to(embedded[story % 8 // 4], RT.OLE_OBJECT if story % 8 // 4 else RT.PACKAGE)
+                    paragraph.add_run()._r.append(parse_xml(object_xml.format(rel_id=rel_id)))
+                written += 1
+            if story == 4:
+                table = document.add_table(rows=1, cols=2)
+                table.cell(0, 0).text = "جدول"
+            document.add_paragraph("")
+            written += 2
+    document.save(path)
+
+
+def describe(section):
+    images = []
+    for image in section["images"]:
+        if isinstance(image, ImageBlob):
+            images.append((image.partname, image.content_type, image.content_hash))
+        else:
+            images.append(image)
+    return section["text"], images
+
+
+def run_parser(parser_class, path):
+    started = time.perf_counter()
+    sections = [describe(section) for section in parser_class(path, save_images=False).iter_sections()]
+    return sections, time.perf_counter() - started
+
+
+def compare(path):
+    reference, reference_time = run_parser(DocxParser, path)
+    fast, fast_time = run_parser(FastDocxParser, path)
+
+    same = reference == fast
+    if not same:
+        for index, (expected, actual) in enumerate(zip(reference, fast)):
+            if expected != actual:
+                print(f"  first difference in section {index}:\n    reference: {expected!r}\n    fast:      {actual!r}")
+                break
+        else:
+            print(f"  section counts differ: reference {len(reference)}, fast {len(fast)}")
+
+    print(f"{os.path.basename(path)}: {len(reference)} sections, {'identical' if same else 'DIFFERENT'}")
+    print(f"  reference {reference_time * 1000:8.1f} ms")
+    print(f"  fast      {fast_time * 1000:8.1f} ms  ({reference_time / fast_time:.1f}x faster)")
+    return same
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("documents", nargs="*", help=".docx files to compare")
+    arg_parser.add_argument("--paragraphs", type=int, default=5000, help="size of the generated bulletin (0 to skip it)")
+    args = arg_parser.parse_args()
+
+    all_same = True
+    with tempfile.TemporaryDirectory() as temp_dir:
+        documents = list(args.documents)
+        if args.paragraphs:
+            generated = os.path.join(temp_dir, f"generated-{args.paragraphs}.docx")
+            make_bulletin(generated, args.paragraphs)
+            documents.append(generated)
+        for path in documents:
+            all_same = compare(path) and all_same
+    sys.exit(0 if all_same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Synthetic bulletins for the benchmarks: a desk (Heading 1) every few
+stories, each story a Heading 4 with long Persian paragraphs and images.
+
+Run from the repository root to write one:
+
+    python benchmarks/docx_generator.py bulletin.docx --sections 200 --images 2 --image-kb 300
+"""
+import argparse
+import io
+import os
+import random
+import struct
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+
+PERSIAN_WORDS = [
+    "خبر", "گزارش", "ادامه‌ی", "سازمان", "اقتصادی", "امروز", "جلسه", "نشست", "تهران", "استان",
+    "بررسی", "مدیرکل", "برنامه", "توسعه", "می‌شود", "کشور", "مردم", "پروژه", "افتتاح", "همکاری",
+]
+
+
+def make_png(seed, width=1, height=1):
+    """
+    Returns a valid RGB PNG whose bytes depend on seed. Larger images are
+    filled with noise, so they do not compress and keep their size when
+    uploaded (about width * height * 3 bytes).
+    """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    if width == height == 1:
+        rows = bytes([0, seed % 256, (seed * 7) % 256, (seed * 13) % 256])
+    else:
+        rng = random.Random(seed)
+        rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b""))
+
+
+def persian_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(PERSIAN_WORDS)
+        words.append(word)
+        size += len(word) + 1
+        if rng.random() < 0.08:
+            words[-1] += "."
+    return " ".join(words)
+
+
+def make_bulletin(path, sections=100, images_per_section=1, paragraph_chars=600, paragraphs_per_section=3,
+                  image_kb=50, stories_per_desk=8, distinct_images=None, seed=0):
+    """
+    Writes a bulletin with `sections` stories. Each story gets
+    `paragraphs_per_section` paragraphs of about `paragraph_chars` Persian
+    characters and `images_per_section` images of about `image_kb` KB. With
+    `distinct_images`, images are drawn from a pool of that size, so some
+    repeat (as logos and file photos do in real bulletins).
+    """
+    rng = random.Random(seed)
+    side = max(1, int((image_kb * 1024 / 3) ** 0.5))
+    pool = {}
+
+    def image(number):
+        if distinct_images:
+            number %= distinct_images
+        if number not in pool:
+            pool[number] = make_png(seed * 100003 + number, side, side)
+        return pool[number]
+
+    document = Document()
+    image_number = 0
+    for story in range(sections):
+        if story % stories_per_desk == 0:
+            document.add_heading(f"دبیرخانه {story // stories_per_desk + 1}", level=1)
+        document.add_heading(f"خبر {story + 1}: {persian_text(rng, 40)}", level=4)
+        for _ in range(paragraphs_per_section):
+            document.add_paragraph(persian_text(rng, paragraph_chars))
+        for _ in range(images_per_section):
+            document.add_paragraph().add_run().add_picture(io.BytesIO(image(image_number)))
+            image_number += 1
+    document.save(path)
+    return path
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Write a synthetic bulletin.")
+    arg_parser.add_argument("path")
+    arg_parser.add_argument("--sections", type=int, default=100)
+    arg_parser.add_argument("--images", type=int, default=1, help="images per section")
+    arg_parser.add_argument("--image-kb", type=int, default=50)
+    arg_parser.add_argument("--chars", type=int, default=600, help="characters per paragraph")
+    arg_parser.add_argument("--paragraphs", type=int, default=3, help="paragraphs per section")
+    args = arg_parser.parse_args()
+    make_bulletin(args.path, args.sections, args.images, args.chars, args.paragraphs, args.image_kb)
+    print(f"Wrote {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
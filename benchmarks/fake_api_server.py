@@ -0,0 +1,317 @@
+"""
+Local stand-in for the Telegram and Bale bot APIs, so the bots can be
+benchmarked without posting to a real channel.
+
+It answers getMe, sendMessage, sendPhoto, sendDocument, sendVideo,
+sendMediaGroup, editMessageText and editMessageCaption for both platforms
+with realistic message objects, and can simulate:
+
+  * request latency (fixed plus random jitter),
+  * flood control: a per-chat rate above which requests get 429 "Retry in N",
+    and/or a random share of 429 responses,
+  * an upload bandwidth cap shared by all concurrent requests.
+
+Point the bots at it with
+
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/telegram/bot
+    BALE_API_BASE_URL=http://127.0.0.1:8081/bale/
+
+Run it on its own from the repository root:
+
+    python benchmarks/fake_api_server.py --port 8081 --latency 0.05 --flood-rate 1
+
+Statistics are served as JSON on /stats.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+FILE_FIELDS = ("photo", "document", "video")
+
+
+class FakeApiServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, flood_rate=0.0, flood_burst=3,
+                 retry_after=1, error_rate=0.0, bandwidth=0.0, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency  # Seconds added to every request
+        self.jitter = jitter  # Up to this many extra seconds, at random
+        self.flood_rate = flood_rate  # Requests per second per chat before 429s (0 = unlimited)
+        self.flood_burst = flood_burst
+        self.retry_after = retry_after  # Seconds announced in 429 responses
+        self.error_rate = error_rate  # Share of requests answered with 429 regardless of rate
+        self.bandwidth = bandwidth  # Upload bytes per second shared by all requests (0 = unlimited)
+        self.random = random.Random(seed)
+
+        self.message_ids = itertools.count(1)
+        self.file_ids = set()
+        self.stats = defaultdict(lambda: {"calls": 0, "rate_limited": 0, "bytes": 0})
+        self._buckets = {}  # (platform, chat) -> [tokens, updated, blocked_until]
+        self._link_free_at = 0.0
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    # -- Lifecycle
+
+    async def start(self):
+        app = web.Application(client_max_size=256 * 1024 * 1024)
+        app.router.add_get("/stats", self._handle_stats)
+        app.router.add_route("*", "/telegram/bot{token}/{method}", self._handle_telegram)
+        app.router.add_route("*", "/bale/bot{token}/{method}", self._handle_bale)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self):
+        """
+        Runs the server on its own event loop in a daemon thread, so the code
+        under test (even another process) can use the main loop freely.
+        """
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop_thread(self):
+        if self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def telegram_base_url(self):
+        return f"http://{self.host}:{self.port}/telegram/bot"
+
+    @property
+    def bale_base_url(self):
+        return f"http://{self.host}:{self.port}/bale/"
+
+    def environment(self):
+        """
+        Settings that point TelegramBot and BaleBot at this server.
+        """
+        return {"TELEGRAM_API_BASE_URL": self.telegram_base_url, "BALE_API_BASE_URL": self.bale_base_url}
+
+    def reset_stats(self):
+        self.stats.clear()
+
+    # -- Request handling
+
+    async def _handle_stats(self, request):
+        return web.json_response(self.stats)
+
+    async def _handle_telegram(self, request):
+        return await self._handle("telegram", request)
+
+    async def _handle_bale(self, request):
+        return await self._handle("bale", request)
+
+    async def _handle(self, platform, request):
+        method = request.match_info["method"]
+        method = method[0].lower() + method[1:]  # python-bale-bot sends "SendPhoto"
+        params, files, size = await self._read_params(request)
+        stats = self.stats[f"{platform}.{method}"]
+        stats["calls"] += 1
+        stats["bytes"] += size
+
+        await self._upload_delay(size)
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        if method == "getMe":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"})
+
+        chat_id = params.get("chat_id", "0")
+        if self._is_flooded(platform, chat_id):
+            stats["rate_limited"] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: Retry in {self.retry_after} seconds",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        try:
+            if method == "sendMediaGroup":
+                media = json.loads(params["media"])
+                return self._ok([self._message(chat_id, item, files, item.get("caption")) for item in media])
+            if method.startswith("send"):
+                return self._ok(self._message(chat_id, params, files, params.get("caption"), params.get("text")))
+            if method.startswith("edit"):
+                message = self._message(chat_id, params, files, params.get("caption"), params.get("text"))
+                message["message_id"] = int(params["message_id"])  # Edits keep the original message
+                message["edit_date"] = message["date"]
+                return self._ok(message)
+        except KeyError as e:
+            return web.json_response(
+                {"ok": False, "error_code": 400, "description": f"Bad Request: {e.args[0]}"}, status=400
+            )
+        return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+
+    async def _read_params(self, request):
+        """
+        Returns (params, uploaded files, request size) for JSON, urlencoded
+        and multipart bodies.
+        """
+        params = {}
+        files = {}
+        if request.content_type == "application/json":
+            body = await request.read()
+            params = json.loads(body or b"{}")
+            return params, files, len(body)
+
+        size = 0
+        if request.content_type == "multipart/form-data":
+            # Parsed by hand: python-bale-bot labels every part "multipart/form-data",
+            # which aiohttp's reader mistakes for nested multipart bodies
+            body = await request.read()
+            boundary = re.search(r'boundary="?([^";]+)"?', request.headers["Content-Type"]).group(1).encode()
+            for part in body.split(b"--" + boundary)[1:-1]:
+                headers, _, data = part.partition(b"\r\n\r\n")
+                data = data[:-2]  # The CRLF before the next boundary
+                name = re.search(rb'name="([^"]*)"', headers).group(1).decode("utf-8")
+                size += len(data)
+                if re.search(rb'filename="', headers):
+                    files[name] = data
+                else:
+                    params[name] = data.decode("utf-8")
+        else:
+            form = await request.post()
+            params = dict(form)
+            size = request.content_length or 0
+        return params, files, size
+
+    def _ok(self, result):
+        return web.json_response({"ok": True, "result": result})
+
+    def _message(self, chat_id, params, files, caption=None, text=None):
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else -1001, "type": "channel"},
+        }
+        if text is not None:
+            message["text"] = text
+        if caption:
+            message["caption"] = caption
+
+        for field in FILE_FIELDS + ("media",):
+            if field not in params and field not in files:
+                continue
+            kind = params.get("type", field) if field == "media" else field
+            file_id = self._file_id(params.get(field), files.get(field), files)
+            if kind == "photo":
+                message["photo"] = [
+                    {"file_id": file_id, "file_unique_id": file_id[-12:], "width": 90, "height": 90},
+                    {"file_id": file_id, "file_unique_id": file_id[-12:], "width": 1280, "height": 1280},
+                ]
+            else:
+                message[kind] = {"file_id": file_id, "file_unique_id": file_id[-12:]}
+        return message
+
+    def _file_id(self, reference, upload, files):
+        """
+        Registers an upload and returns its file_id, or checks a file_id the
+        client sent instead of bytes.
+        """
+        if upload is None and reference and reference.startswith("attach://"):
+            upload = files[reference[len("attach://"):]]
+        if upload is not None:
+            file_id = "fake-" + hashlib.sha256(upload).hexdigest()[:24]
+            self.file_ids.add(file_id)
+            return file_id
+        if reference not in self.file_ids:
+            raise KeyError("wrong file identifier")
+        return reference
+
+    def _is_flooded(self, platform, chat_id):
+        if self.error_rate and self.random.random() < self.error_rate:
+            return True
+        if not self.flood_rate:
+            return False
+
+        now = time.monotonic()
+        bucket = self._buckets.setdefault((platform, chat_id), [self.flood_burst, now, 0.0])
+        if now < bucket[2]:
+            return True
+        bucket[0] = min(self.flood_burst, bucket[0] + (now - bucket[1]) * self.flood_rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] = now + self.retry_after  # Like Telegram, refuse everything until Retry-After passes
+            return True
+        bucket[0] -= 1
+        return False
+
+    async def _upload_delay(self, size):
+        """
+        Models one shared uplink: each request's bytes are queued behind the
+        bytes of the requests before it.
+        """
+        if not self.bandwidth or not size:
+            return
+        now = time.monotonic()
+        start = max(now, self._link_free_at)
+        self._link_free_at = start + size / self.bandwidth
+        await asyncio.sleep(self._link_free_at - now)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Fake Telegram/Bale bot API server.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8081)
+    arg_parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    arg_parser.add_argument("--jitter", type=float, default=0.02, help="up to this many extra seconds per request")
+    arg_parser.add_argument("--flood-rate", type=float, default=0.0, help="requests per second per chat before 429s")
+    arg_parser.add_argument("--flood-burst", type=int, default=3)
+    arg_parser.add_argument("--retry-after", type=int, default=1, help="seconds announced in 429 responses")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    arg_parser.add_argument("--bandwidth", type=float, default=0.0, help="upload cap in MB/s")
+    args = arg_parser.parse_args()
+
+    server = FakeApiServer(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        flood_rate=args.flood_rate, flood_burst=args.flood_burst, retry_after=args.retry_after,
+        error_rate=args.error_rate, bandwidth=args.bandwidth * 1e6,
+    )
+
+    async def serve():
+        await server.start()
+        print(f"Fake API server listening on {args.host}:{server.port}")
+        for name, value in server.environment().items():
+            print(f"  {name}={value}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
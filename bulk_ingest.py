@@ -0,0 +1,89 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from image_blob import ImageBlob, ZipImagePart
+from instrumentation import get_timings
+from parse_cache import ParseCache
+from send_journal import SendJournal
+
+
+def collect_documents(paths):
+    """
+    Expands files and folders into the list of .docx files to publish, in a
+    deterministic order: the order given, with each folder's documents
+    sorted by name. Duplicates are dropped.
+    """
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(
+                name for name in os.listdir(path)
+                if name.lower().endswith(".docx") and not name.startswith("~$")  # "~$" files are Word's lock files
+            )
+            candidates = [os.path.join(path, name) for name in names]
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            candidate = os.path.abspath(candidate)
+            if candidate not in documents:
+                documents.append(candidate)
+    return documents
+
+
+def parse_document(file_path, save_images=False):
+    """
+    Runs in a worker process: parses one document (through the parse cache)
+    and returns its SendJournal.document_id and its sections. In-memory
+    images are sent back as references into the .docx zip, so no image
+    bytes cross the process boundary.
+    """
+    document_id = SendJournal.document_id(file_path)
+    sections = []
+    for section in ParseCache().iter_sections(file_path, save_images=save_images, document_id=document_id):
+        images = [
+            # The hash computed here travels along, so the parent never re-reads the image
+            ImageBlob(ZipImagePart(file_path, image.partname, image.content_type), content_hash=image.content_hash)
+            if isinstance(image, ImageBlob) else image
+            for image in section["images"]
+        ]
+        sections.append({"text": section["text"], "images": images})
+    return document_id, sections
+
+
+async def publish_documents(paths, publisher, save_images=False, optimizer=None, max_workers=None):
+    """
+    Parses many documents in parallel on a process pool and publishes them
+    one after another, in the order collect_documents returns. Sending the
+    first document starts as soon as it is parsed, while the others are
+    still being parsed. Returns the publish() result of each document.
+    """
+    documents = collect_documents(paths)
+    if not documents:
+        print("No .docx documents found.")
+        return {}
+
+    max_workers = max_workers or int(os.getenv("PARSE_WORKERS", "0")) or None
+    workers = min(max_workers or os.cpu_count() or 1, len(documents))
+    print(f"Parsing {len(documents)} documents on {workers} processes...")
+
+    results = {}
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(parse_document, path, save_images) for path in documents]
+        async with publisher:
+            for path, future in zip(documents, futures):
+                try:
+                    with get_timings().span("parse.document_wait"):  # Parse time the pool did not hide
+                        document_id, sections = await asyncio.wrap_future(future)
+                except Exception as e:
+                    print(f"Error extracting content from {path}: {e}")
+                    continue
+
+                if optimizer:
+                    sections = optimizer.optimize_sections(sections)
+                # With a journal, re-running a batch resumes, never re-posts
+                results[path] = await publisher.publish(sections, document_id, os.path.basename(path))
+                print(f"Published {os.path.basename(path)}: {results[path]}")
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    return results
@@ -1,89 +1,82 @@
 from docx import Document
+from docx.oxml.ns import nsmap, qn
+from lxml import etree
+from image_blob import ImageBlob, save_image
+from section_rules import load_section_rules
 import os
 
+# Pictures, videos and embedded files (Word, Excel, PDF, ...) in document order
+ATTACHMENTS = etree.XPath(
+    ".//a:blip | .//a:videoFile | .//o:OLEObject",
+    namespaces={**nsmap, "o": "urn:schemas-microsoft-com:office:office"},
+)
+OLE_BINARY = "application/vnd.openxmlformats-officedocument.oleObject"  # Needs unwrapping; not sent
+
 class DocxParser:
-    def __init__(self, file_path):
+    def __init__(self, file_path, save_images=True, rules=None):
         try:
             self.file_path = file_path
+            # When False, sections carry ImageBlob references instead of file paths
+            self.save_images = save_images
+            self.rules = rules or load_section_rules()
             self.document = Document(file_path)
             print(f"Successfully loaded the document: {file_path}")
         except Exception as e:
             print(f"Error loading document: {e}")
             raise
 
-    def extract_headings_content_with_images(self):
-        
-        #It will extract text and images within each Heading 4 section.
-        #Includes the latest Heading 1 above each Heading 4.
-        #It will stop gathering if a new Heading arrives.
-        
-        extracted_data = []
-        current_content = None
-        current_images = []
-        current_heading_1 = ""  # Track the latest Heading 1
-        collecting = False  # Flag to indicate collecting content
-        custom_heading_text = "خبر!"  # Custom titr
+    def iter_sections(self):
+        """
+        Yields each section as soon as the next heading closes it. Every
+        section is a dict with "text" and "images", the same shape
+        extract_headings_content_with_images returns. How the document is
+        split is decided by the section rules (see section_rules.py).
+        """
         images_output_dir = "extracted_images"
 
         # Ensure the output directory exists
-        os.makedirs(images_output_dir, exist_ok=True)
-
-        image_counter = 0
-        for para in self.document.paragraphs:
-            if para.style.name == 'Heading 1':
-                # Update the current Heading 1
-                current_heading_1 = para.text.strip() if para.text.strip() else ""
-
-                # If we are collecting and encounter a new Heading 1, save the current section
-                if collecting and (current_content or current_images):
-                    enriched_text = f"{current_heading_1}\n\n{current_content.strip() if current_content else custom_heading_text}"
-                    extracted_data.append({
-                        "text": enriched_text.strip(),
-                        "images": current_images
-                    })
-                collecting = False  # Stop collecting content
-                current_content = None
-                current_images = []
+        if self.save_images:
+            os.makedirs(images_output_dir, exist_ok=True)
 
-            elif para.style.name == 'Heading 4':
-                # Save the current section before moving to the next
-                if collecting and (current_content or current_images):
-                    enriched_text = f"#{current_heading_1}\n\n{current_content.strip() if current_content else custom_heading_text}"
-                    extracted_data.append({
-                        "text": enriched_text.strip(),
-                        "images": current_images
-                    })
+        saved_images = {}  # Image part name -> path or ImageBlob, so repeated images are handled once
+        paragraphs = (
+            (self.rules.action(para.style.name), para.text, self._iter_images(para, saved_images, images_output_dir))
+            for para in self.document.paragraphs
+        )
+        yield from self.rules.build_sections(paragraphs)
 
-                # Start a new section
-                current_content = para.text.strip() if para.text.strip() else custom_heading_text
-                current_images = []
-                collecting = True
+    def _iter_images(self, para, saved_images, images_output_dir):
+        # Check for images, videos and embedded files in the paragraph's runs
+        related_parts = self.document.part.related_parts
+        for run in para.runs:
+            for element in ATTACHMENTS(run.element):
+                if element.tag == qn("a:blip"):
+                    image_part = related_parts.get(element.get(qn("r:embed")))
+                    if image_part is None:
+                        continue  # A linked picture; the file is not in the document
+                else:
+                    rel_id = element.get(qn("r:id")) or element.get(qn("r:link")) or element.get(qn("r:embed"))
+                    image_part = related_parts.get(rel_id)
+                    if image_part is None or image_part.content_type == OLE_BINARY:
+                        continue  # Linked from outside the document, or an OLE binary
+                if image_part.partname not in saved_images:
+                    if self.save_images:
+                        saved_images[image_part.partname] = self._save_image(image_part, images_output_dir)
+                    else:
+                        saved_images[image_part.partname] = ImageBlob(image_part)
+                yield saved_images[image_part.partname]
 
-            elif collecting:
-                # Collect text content
-                if para.text.strip():
-                    current_content += "\n" + para.text.strip()
+    @staticmethod
+    def _save_image(image_part, images_output_dir):
+        """
+        Saves an image under the SHA-256 of its bytes (see image_blob.save_image).
+        """
+        return save_image(ImageBlob(image_part), images_output_dir)
 
-                # Check for images in the paragraph's runs
-                for run in para.runs:
-                    if run.element.xpath(".//a:blip"):
-                        for blip in run.element.xpath(".//a:blip"):
-                            embed_rel_id = blip.get("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed")
-                            image_part = self.document.part.related_parts[embed_rel_id]
-                            # Save image
-                            image_ext = image_part.content_type.split("/")[-1]  # Get file extension (e.g., jpg)
-                            image_path = os.path.join(images_output_dir, f"image_{image_counter}.{image_ext}")
-                            with open(image_path, "wb") as img_file:
-                                img_file.write(image_part.blob)
-                            current_images.append(image_path)
-                            image_counter += 1
-
-        # Add the last section
-        if collecting and (current_content or current_images):
-            enriched_text = f"{current_heading_1}\n\n{current_content.strip() if current_content else custom_heading_text}"
-            extracted_data.append({
-                "text": enriched_text.strip(),
-                "images": current_images
-            })
-
-        return extracted_data
\ No newline at end of file
+    def extract_headings_content_with_images(self):
+        
+        #It will extract text and images within each section.
+        #With the default rules: each Heading 4 section, with the latest Heading 1 above it.
+        #It will stop gathering if a new Heading arrives.
+        
+        return list(self.iter_sections())
\ No newline at end of file
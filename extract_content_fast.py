@@ -0,0 +1,245 @@
+import os
+import posixpath
+import zipfile
+from lxml import etree
+from image_blob import ImageBlob, ZipImagePart, save_image
+from section_rules import load_section_rules
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+W_P, W_R, W_T, W_BR, W_HYPERLINK, W_PPR = (f"{W}{tag}" for tag in ("p", "r", "t", "br", "hyperlink", "pPr"))
+A_BLIP = "{http://schemas.openxmlformats.org/drawingml/2006/main}blip"
+A_VIDEO_FILE = "{http://schemas.openxmlformats.org/drawingml/2006/main}videoFile"
+O_OLE_OBJECT = "{urn:schemas-microsoft-com:office:office}OLEObject"
+OLE_BINARY = "application/vnd.openxmlformats-officedocument.oleObject"
+PKG_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+PKG_TYPES = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+STYLES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+XML_PARSER = etree.XMLParser(resolve_entities=False)  # Same hardening as python-docx
+
+# Word stores these built-in names in lower case; python-docx shows them capitalised
+UI_STYLE_NAMES = {
+    "caption": "Caption",
+    "footer": "Footer",
+    "header": "Header",
+    **{f"heading {level}": f"Heading {level}" for level in range(1, 10)},
+}
+
+# Text equivalents of the run children python-docx includes in Run.text
+RUN_TEXT = {
+    f"{W}tab": "\t",
+    f"{W}ptab": "\t",
+    f"{W}cr": "\n",
+    f"{W}noBreakHyphen": "-",
+}
+ON_VALUES = ("1", "true", "on")
+
+
+class FastDocxParser:
+    """
+    Drop-in replacement for DocxParser that streams word/document.xml with
+    lxml iterparse instead of building python-docx objects. The section
+    rules are compiled once into a style id -> action table, and each
+    paragraph's text and image ids are read in a single pass. DocxParser
+    stays the reference implementation; see tests/test_parser_equivalence.py
+    and benchmarks/compare_parsers.py.
+    """
+
+    def __init__(self, file_path, save_images=True, rules=None):
+        try:
+            self.file_path = file_path
+            self.save_images = save_images
+            self.rules = rules or load_section_rules()
+            with zipfile.ZipFile(file_path) as docx_zip:
+                self.document_partname = self._document_partname(docx_zip)
+                relationships = self._read_relationships(docx_zip)
+                self.related_partnames = {rel_id: partname for rel_id, _, partname in relationships}
+                style_names, default_style_name = self._read_style_names(docx_zip, relationships)
+                # Style id -> section action, so paragraphs are dispatched without comparing names
+                self.style_actions, self.default_action = self.rules.compile(style_names, default_style_name)
+                self.content_types = self._read_content_types(docx_zip)
+            print(f"Successfully loaded the document: {file_path}")
+        except Exception as e:
+            print(f"Error loading document: {e}")
+            raise
+
+    def iter_sections(self):
+        """
+        Yields the same sections as DocxParser.iter_sections, in the same order.
+        """
+        images_output_dir = "extracted_images"
+
+        if self.save_images:
+            os.makedirs(images_output_dir, exist_ok=True)
+
+        saved_images = {}  # Image part name -> path or ImageBlob, so repeated images are handled once
+        paragraphs = (
+            (action, text, self._iter_images(image_ids, saved_images, images_output_dir))
+            for action, text, image_ids in self._iter_paragraphs()
+        )
+        yield from self.rules.build_sections(paragraphs)
+
+    def _iter_images(self, image_ids, saved_images, images_output_dir):
+        for image_id in image_ids:
+            partname = self.related_partnames[image_id]
+            if partname not in saved_images:
+                image = ImageBlob(ZipImagePart(self.file_path, partname, self._content_type(partname)))
+                if self.save_images:
+                    saved_images[partname] = save_image(image, images_output_dir)
+                else:
+                    saved_images[partname] = image
+            yield saved_images[partname]
+
+    def extract_headings_content_with_images(self):
+        return list(self.iter_sections())
+
+    def _iter_paragraphs(self):
+        """
+        Yields (section action, text, image relationship ids) for every paragraph
+        directly in the document body, like Document.paragraphs. Paragraphs
+        are freed as soon as they are read, so memory stays flat.
+        """
+        body_tag = f"{W}body"
+        with zipfile.ZipFile(self.file_path) as docx_zip, docx_zip.open(self.document_partname.lstrip("/")) as xml:
+            for _, paragraph in etree.iterparse(xml, events=("end",), tag=W_P, resolve_entities=False):
+                body = paragraph.getparent()
+                if body is None or body.tag != body_tag:
+                    continue  # Table cells and text boxes are read as part of their parent
+                yield self._read_paragraph(paragraph)
+                paragraph.clear()
+                while paragraph.getprevious() is not None:
+                    del body[0]  # Also drops tables between body paragraphs
+
+    def _read_paragraph(self, paragraph):
+        style_id = None
+        text = []
+        image_ids = []
+        for child in paragraph:
+            tag = child.tag
+            if tag == W_R:
+                self._read_run(child, text)
+                # Like DocxParser, images count only in runs directly under the paragraph
+                for element in child.iter(A_BLIP, A_VIDEO_FILE, O_OLE_OBJECT):
+                    image_id = self._attachment_id(element)
+                    if image_id is not None:
+                        image_ids.append(image_id)
+            elif tag == W_HYPERLINK:
+                for run in child.iterchildren(W_R):
+                    self._read_run(run, text)
+            elif tag == W_PPR:
+                style = child.find(f"{W}pStyle")
+                if style is not None:
+                    style_id = style.get(f"{W}val")
+        return self.style_actions.get(style_id, self.default_action), "".join(text), image_ids
+
+    def _attachment_id(self, element):
+        """
+        Returns the relationship id of a picture, video or embedded file, or
+        None when it is external or an OLE binary that cannot be sent as it is.
+        """
+        if element.tag == A_BLIP:
+            rel_id = element.get(f"{R}embed")
+        elif element.tag == A_VIDEO_FILE:
+            rel_id = element.get(f"{R}link") or element.get(f"{R}embed")
+        else:
+            rel_id = element.get(f"{R}id")
+        if rel_id not in self.related_partnames:
+            return None
+        if element.tag == O_OLE_OBJECT and self._content_type(self.related_partnames[rel_id]) == OLE_BINARY:
+            return None
+        return rel_id
+
+    @staticmethod
+    def _read_run(run, text):
+        """
+        Appends the run's text the way python-docx's Run.text renders it.
+        """
+        for child in run:
+            tag = child.tag
+            if tag == W_T:
+                text.append(child.text or "")
+            elif tag == W_BR:
+                if child.get(f"{W}type", "textWrapping") == "textWrapping":
+                    text.append("\n")  # Page and column breaks have no text
+            elif tag in RUN_TEXT:
+                text.append(RUN_TEXT[tag])
+
+    @staticmethod
+    def _part_xml(docx_zip, partname):
+        try:
+            return etree.fromstring(docx_zip.read(partname.lstrip("/")), XML_PARSER)
+        except KeyError:
+            return None
+
+    def _document_partname(self, docx_zip):
+        root = self._part_xml(docx_zip, "/_rels/.rels")
+        for rel in root.iterchildren(f"{PKG_RELS}Relationship"):
+            if rel.get("Type") == OFFICE_DOCUMENT:
+                return posixpath.normpath(posixpath.join("/", rel.get("Target")))
+        raise ValueError("No main document part in package")
+
+    def _read_relationships(self, docx_zip):
+        """
+        Returns (id, type, target partname) for the main document's internal
+        relationships.
+        """
+        directory, filename = posixpath.split(self.document_partname)
+        root = self._part_xml(docx_zip, f"{directory}/_rels/{filename}.rels")
+        if root is None:
+            return []
+        return [
+            (rel.get("Id"), rel.get("Type"), posixpath.normpath(posixpath.join(directory, rel.get("Target"))))
+            for rel in root.iterchildren(f"{PKG_RELS}Relationship")
+            if rel.get("TargetMode") != "External"
+        ]
+
+    def _read_style_names(self, docx_zip, relationships):
+        """
+        Maps every paragraph style id to its UI name, and finds the name of
+        the default paragraph style used for unstyled paragraphs and unknown
+        style ids.
+        """
+        style_names = {}
+        default_style_name = None
+        styles_partname = next((partname for _, rel_type, partname in relationships if rel_type == STYLES), None)
+        root = self._part_xml(docx_zip, styles_partname) if styles_partname else None
+        if root is None:
+            return style_names, default_style_name
+
+        for style in root.iterchildren(f"{W}style"):
+            if style.get(f"{W}type") != "paragraph":
+                continue
+            name_element = style.find(f"{W}name")
+            name = None
+            if name_element is not None:
+                name = UI_STYLE_NAMES.get(name_element.get(f"{W}val"), name_element.get(f"{W}val"))
+            style_names.setdefault(style.get(f"{W}styleId"), name)  # The first definition wins
+            if style.get(f"{W}default") in ON_VALUES:
+                default_style_name = name  # The last default wins
+        return style_names, default_style_name
+
+    def _read_content_types(self, docx_zip):
+        """
+        Returns the part name overrides and extension defaults, keyed in
+        lower case: like python-docx, both are matched case-insensitively.
+        """
+        root = self._part_xml(docx_zip, "/[Content_Types].xml")
+        overrides = {
+            element.get("PartName").lower(): element.get("ContentType")
+            for element in root.iterchildren(f"{PKG_TYPES}Override")
+        }
+        defaults = {
+            element.get("Extension").lower(): element.get("ContentType")
+            for element in root.iterchildren(f"{PKG_TYPES}Default")
+        }
+        return overrides, defaults
+
+    def _content_type(self, partname):
+        overrides, defaults = self.content_types
+        if partname.lower() in overrides:
+            return overrides[partname.lower()]
+        extension = posixpath.splitext(partname)[1][1:].lower()
+        if extension in defaults:
+            return defaults[extension]
+        raise KeyError(f"no content type for partname '{partname}' in [Content_Types].xml")
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sqlite3
+
+# Seconds a chat waits for another chat's upload of the same image before
+# uploading it itself
+CLAIM_TIMEOUT = float(os.getenv("FILE_ID_CLAIM_TIMEOUT", "120"))
+
+
+class FileIdCache:
+    """
+    Persistent map of image content hash -> platform file_id.
+
+    Once a photo has been uploaded, the platform returns a file_id that can be
+    sent again without uploading the bytes. Entries are scoped per bot (e.g.
+    "telegram:123456"), because a file_id is only valid for the bot that
+    received it, but within one bot it works in every chat.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("FILE_ID_CACHE_PATH", "file_id_cache.sqlite3")
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            "scope TEXT NOT NULL, content_hash TEXT NOT NULL, file_id TEXT NOT NULL, "
+            "PRIMARY KEY (scope, content_hash))"
+        )
+        self.connection.commit()
+        self._uploads = {}  # (scope, content_hash) -> Event set when an upload in progress ends
+
+    def get(self, scope, content_hash):
+        row = self.connection.execute(
+            "SELECT file_id FROM file_ids WHERE scope = ? AND content_hash = ?",
+            (scope, content_hash),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, scope, content_hash, file_id):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO file_ids (scope, content_hash, file_id) VALUES (?, ?, ?)",
+            (scope, content_hash, file_id),
+        )
+        self.connection.commit()
+        self.release(scope, content_hash)
+
+    async def claim(self, scope, content_hash, timeout=CLAIM_TIMEOUT):
+        """
+        Returns the cached file_id, or None when the caller should upload the
+        image; the caller must then call put() or release(). While one chat
+        uploads an image, other chats of the same bot wait here, up to
+        `timeout` seconds, and get its file_id instead of uploading the same
+        bytes again.
+        """
+        key = (scope, content_hash)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            file_id = self.get(scope, content_hash)
+            if file_id:
+                return file_id
+            upload = self._uploads.get(key)
+            if upload is None:
+                self._uploads[key] = asyncio.Event()
+                return None
+            try:
+                # If that upload fails, the next waiter claims it
+                await asyncio.wait_for(upload.wait(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                print(f"Gave up waiting for another upload of {content_hash[:12]}, uploading it again.")
+                return None
+
+    async def claim_many(self, scope, content_hashes):
+        """
+        Claims every image of an album. Returns {content hash: file_id or
+        None}, with None for the images the caller must upload and then put()
+        or release(). Claims are taken in sorted hash order, so two chats
+        sending albums that share images never wait on each other in a cycle.
+        """
+        claims = {}
+        for content_hash in sorted(set(content_hashes)):
+            claims[content_hash] = await self.claim(scope, content_hash)
+        return claims
+
+    def release(self, scope, content_hash):
+        """
+        Ends a claim, waking the chats that wait for this image.
+        """
+        upload = self._uploads.pop((scope, content_hash), None)
+        if upload is not None:
+            upload.set()
+
+    def forget(self, scope, content_hash):
+        """
+        Drops an entry whose file_id the platform no longer accepts.
+        """
+        self.connection.execute(
+            "DELETE FROM file_ids WHERE scope = ? AND content_hash = ?",
+            (scope, content_hash),
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+_cache = None
+
+
+def get_file_id_cache():
+    """
+    Returns the process-wide FileIdCache shared by all bots.
+    """
+    global _cache
+    if _cache is None:
+        _cache = FileIdCache()
+    return _cache
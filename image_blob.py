@@ -0,0 +1,270 @@
+import hashlib
+import io
+import mimetypes
+import os
+import posixpath
+import shutil
+import zipfile
+from instrumentation import get_timings
+
+CHUNK_SIZE = 64 * 1024  # Uploads and hashes read files this much at a time
+STAGE_MAX_BYTES = int(os.getenv("STAGE_MAX_BYTES", str(1024 * 1024)))  # Larger files are streamed, never held
+
+
+class ImageBlob:
+    """
+    Reference to an image (or another embedded file, such as a document or
+    a video) inside a loaded .docx package.
+
+    Sections hold these instead of file paths when images are not written to
+    disk. The bytes stay in the document's part; open() streams them, so
+    they are never held in memory as a whole.
+    """
+
+    __slots__ = ("_part", "_content_hash")
+
+    def __init__(self, image_part, content_hash=None):
+        self._part = image_part
+        self._content_hash = content_hash
+
+    @property
+    def data(self):
+        return self._part.blob
+
+    def open(self):
+        """
+        Returns a binary file object reading the part from the start.
+        """
+        if hasattr(self._part, "open"):
+            return self._part.open()
+        return io.BytesIO(self._part.blob)  # python-docx parts are already in memory
+
+    @property
+    def size(self):
+        if hasattr(self._part, "size"):
+            return self._part.size
+        return len(self._part.blob)
+
+    @property
+    def partname(self):
+        return str(self._part.partname)
+
+    @property
+    def content_type(self):
+        return self._part.content_type
+
+    @property
+    def ext(self):
+        if self.content_type.startswith("image/"):
+            return self.content_type.split("/")[-1]  # e.g. "png", "jpeg"
+        return posixpath.splitext(self.partname)[1][1:].lower() or "bin"  # e.g. "docx", "mp4"
+
+    @property
+    def content_hash(self):
+        if self._content_hash is None:
+            with self.open() as f:
+                self._content_hash = _sha256(f)
+        return self._content_hash
+
+    @property
+    def filename(self):
+        if isinstance(self._part, FileImagePart):
+            return os.path.basename(self._part.path)
+        return f"{self.content_hash}.{self.ext}"
+
+    def __str__(self):
+        if isinstance(self._part, FileImagePart):
+            return self._part.path
+        return f"docx:{self._part.partname}"
+
+    def __repr__(self):
+        return f"<ImageBlob {self._part.partname} {self.content_type}>"
+
+
+class ZipImagePart:
+    """
+    Stand-in for a python-docx image part that reads its bytes straight from
+    the .docx zip, so cached sections and FastDocxParser need no python-docx
+    objects.
+    """
+
+    __slots__ = ("docx_path", "partname", "content_type")
+
+    def __init__(self, docx_path, partname, content_type):
+        self.docx_path = docx_path
+        self.partname = partname
+        self.content_type = content_type
+
+    @property
+    def blob(self):
+        with zipfile.ZipFile(self.docx_path) as docx_zip:
+            return docx_zip.read(self.partname.lstrip("/"))
+
+    def open(self):
+        # The zip file stays open until the member is closed
+        with zipfile.ZipFile(self.docx_path) as docx_zip:
+            return docx_zip.open(self.partname.lstrip("/"))
+
+    @property
+    def size(self):
+        with zipfile.ZipFile(self.docx_path) as docx_zip:
+            return docx_zip.getinfo(self.partname.lstrip("/")).file_size
+
+
+class MemoryImagePart:
+    """
+    Stand-in for an image part whose bytes are already in memory, such as
+    an image staged for its upload.
+    """
+
+    __slots__ = ("blob", "partname", "content_type")
+
+    def __init__(self, blob, partname, content_type):
+        self.blob = blob
+        self.partname = partname
+        self.content_type = content_type
+
+
+class FileImagePart:
+    """
+    Stand-in for an image part backed by a file on disk, so a path can be
+    streamed like any other ImageBlob.
+    """
+
+    __slots__ = ("path", "partname", "content_type")
+
+    def __init__(self, path, content_type):
+        self.path = path
+        self.partname = path
+        self.content_type = content_type
+
+    @property
+    def blob(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def open(self):
+        return open(self.path, "rb")
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+
+def _sha256(f):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_image(image):
+    """
+    Returns an ImageBlob holding the bytes and hash of an image given as a
+    path or an ImageBlob, so sending it reads nothing more. Files larger
+    than STAGE_MAX_BYTES are only hashed and stay streamed. Slow work
+    (reading the .docx zip or the file, hashing), meant for a worker thread.
+    """
+    image_hash(image)  # Computed here rather than on the event loop
+    if image_size(image) > STAGE_MAX_BYTES:
+        return image
+    if isinstance(image, ImageBlob):
+        part = MemoryImagePart(image.data, image.partname, image.content_type)
+        return ImageBlob(part, content_hash=image.content_hash)
+    with open(image, "rb") as f:
+        data = f.read()
+    content_type = mimetypes.guess_type(image)[0] or "application/octet-stream"
+    return ImageBlob(MemoryImagePart(data, os.path.abspath(image), content_type), content_hash=image_hash(data))
+
+
+def save_image(image, images_output_dir):
+    """
+    Saves an ImageBlob under the SHA-256 of its bytes, so identical images
+    share one file and images already on disk from earlier runs are not
+    rewritten. Returns the path.
+    """
+    image_path = os.path.join(images_output_dir, image.filename)
+    if not os.path.exists(image_path):
+        temp_path = f"{image_path}.{os.getpid()}.tmp"
+        with get_timings().span("image.write"):
+            with image.open() as source, open(temp_path, "wb") as img_file:
+                shutil.copyfileobj(source, img_file, CHUNK_SIZE)
+            os.replace(temp_path, image_path)  # Never leave a half-written image under its final name
+    return image_path
+
+
+def as_image_blob(image):
+    """
+    Returns an image given as a path or an ImageBlob as an ImageBlob, so
+    callers can tell files to upload apart from file_ids, which are strings.
+    """
+    if isinstance(image, ImageBlob):
+        return image
+    path = os.path.abspath(image)
+    return ImageBlob(FileImagePart(path, mimetypes.guess_type(path)[0] or "application/octet-stream"))
+
+
+def open_image(image):
+    """
+    Returns a binary file object for an image given as a path or an
+    ImageBlob. Uploads stream from it in CHUNK_SIZE pieces.
+    """
+    if isinstance(image, ImageBlob):
+        return image.open()
+    return open(image, "rb")
+
+
+def image_size(image):
+    """
+    Returns the size in bytes of an image given as a path or an ImageBlob.
+    """
+    if isinstance(image, ImageBlob):
+        return image.size
+    return os.path.getsize(image)
+
+
+def image_hash(image):
+    """
+    Returns the SHA-256 of an image given as a path, an ImageBlob or bytes.
+    """
+    if isinstance(image, ImageBlob):
+        return image.content_hash
+    if isinstance(image, bytes):
+        return hashlib.sha256(image).hexdigest()
+    with open(image, "rb") as f:
+        return _sha256(f)
+
+
+def image_filename(image):
+    """
+    Returns a file name to upload an image under.
+    """
+    if isinstance(image, ImageBlob):
+        return image.filename
+    return os.path.basename(image)
+
+
+def media_kind(image):
+    """
+    Returns how a section attachment is sent: "photo" for images, "video"
+    for videos and "document" for anything else (embedded Word, Excel or
+    PDF files, ...).
+    """
+    if isinstance(image, ImageBlob):
+        content_type = image.content_type
+    else:
+        content_type = mimetypes.guess_type(image)[0] or ""
+    if content_type.startswith("image/"):
+        return "photo"
+    if content_type.startswith("video/"):
+        return "video"
+    return "document"
+
+
+def split_media(images):
+    """
+    Splits a section's attachments into (photos, other files), keeping their order.
+    """
+    photos = [image for image in images if media_kind(image) == "photo"]
+    files = [image for image in images if media_kind(image) != "photo"]
+    return photos, files
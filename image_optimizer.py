@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from image_blob import ImageBlob, media_kind
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent unchanged
+    Image = None
+
+
+def optimize_image(source, max_size, quality, output_dir):
+    """
+    Downscales an image so its longest side is at most `max_size` pixels and
+    re-encodes it as a progressive JPEG. The EXIF orientation is applied
+    first, since the re-encoded copy carries no EXIF. `source` is a file path or the image
+    bytes. Returns the path of the optimized copy, or None when the original
+    should be sent as it is. Runs in a worker process.
+    """
+    data = source if isinstance(source, bytes) else None
+    if data is None:
+        with open(source, "rb") as f:
+            data = f.read()
+    # "upright" keeps copies written before the orientation was applied from being reused
+    output_path = os.path.join(output_dir, f"{hashlib.sha256(data).hexdigest()}_{max_size}_{quality}_upright.jpg")
+    if os.path.exists(output_path):
+        return output_path
+
+    with Image.open(io.BytesIO(data)) as image:
+        if getattr(image, "is_animated", False):
+            return None  # Keep animated GIFs as they are
+
+        image = ImageOps.exif_transpose(image)  # Camera photos are stored sideways with an Orientation tag
+        image.thumbnail((max_size, max_size))
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        temp_path = f"{output_path}.{os.getpid()}.tmp"
+        image.save(temp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+
+    if os.path.getsize(temp_path) >= len(data):
+        os.remove(temp_path)
+        return None
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+class ImageOptimizer:
+    """
+    Optional stage between DocxParser and the bots that shrinks section images
+    on a process pool. Images of the next few sections are optimized while
+    the current one is being uploaded.
+    """
+
+    def __init__(self, max_size=None, quality=None, output_dir=None, max_workers=None):
+        if Image is None:
+            raise ImportError("Pillow is required for image optimization (pip install Pillow)")
+        # Telegram stores photos at up to 2560px on the long side, larger uploads are wasted
+        self.max_size = int(max_size or os.getenv("IMAGE_MAX_SIZE", 2560))
+        self.quality = int(quality or os.getenv("IMAGE_QUALITY", 85))
+        self.output_dir = output_dir or os.path.join("extracted_images", "optimized")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    def optimize_sections(self, sections, lookahead=4):
+        """
+        Yields the sections in their original order with image paths replaced
+        by optimized copies, keeping up to `lookahead` sections in the pool.
+        Embedded documents and videos are passed through untouched.
+        """
+        pending = deque()
+        for section in sections:
+            futures = [
+                self.executor.submit(
+                    optimize_image,
+                    image.data if isinstance(image, ImageBlob) else image,  # Worker processes get plain bytes
+                    self.max_size, self.quality, self.output_dir,
+                ) if media_kind(image) == "photo" else None
+                for image in section.get("images", [])
+            ]
+            pending.append((section, futures))
+            if len(pending) > lookahead:
+                yield self._resolve(*pending.popleft())
+
+        while pending:
+            yield self._resolve(*pending.popleft())
+
+    def _resolve(self, section, futures):
+        images = []
+        for image, future in zip(section.get("images", []), futures):
+            if future is None:
+                images.append(image)
+                continue
+            try:
+                images.append(future.result() or image)
+            except Exception as e:
+                print(f"Error optimizing image {image}, sending original: {e}")
+                images.append(image)
+        return {**section, "images": images}
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
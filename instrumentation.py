@@ -0,0 +1,120 @@
+import contextlib
+import json
+import math
+import os
+import time
+from collections import defaultdict
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values), math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[rank]
+
+
+class Timings:
+    """
+    Collects how long each stage of a run takes: document loading, the
+    paragraph scan, image writes, every API call and every flood-control
+    wait. Span names are dotted ("telegram.sendPhoto", "throttle.retry_after")
+    and the end-of-run report groups them by name.
+
+    With TIMINGS_JSONL set, every span is also appended to that file as one
+    JSON line, for offline analysis.
+    """
+
+    def __init__(self, jsonl_path=None):
+        self.started = time.perf_counter()
+        self.durations = defaultdict(list)  # Span name -> durations in seconds
+        self.counters = defaultdict(int)  # e.g. "bytes_uploaded"
+        self.jsonl_path = jsonl_path
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8", buffering=1) if jsonl_path else None
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        """
+        Times the body of a `with` block, in sync or async code.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    def iter(self, name, iterable):
+        """
+        Yields from `iterable`, timing how long each item takes to produce
+        (not how long the consumer holds it).
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                duration = time.perf_counter() - start
+            self.record(name, duration)
+            yield item
+
+    def record(self, name, duration, **fields):
+        self.durations[name].append(duration)
+        if self._jsonl is not None:
+            line = {"span": name, "at": round(time.time(), 6), "duration": round(duration, 6), **fields}
+            self._jsonl.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def report(self):
+        """
+        Prints p50/p95 per span name, bytes uploaded and time throttled.
+        """
+        elapsed = time.perf_counter() - self.started
+        print(f"\nPerformance report ({elapsed:.1f}s since start)")
+        if not self.durations:
+            print("  No spans recorded.")
+            return
+
+        print(f"  {'span':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'total s':>10}")
+        for name in sorted(self.durations):
+            values = sorted(self.durations[name])
+            print(
+                f"  {name:<28}{len(values):>7}{percentile(values, 0.5) * 1000:>10.1f}"
+                f"{percentile(values, 0.95) * 1000:>10.1f}{values[-1] * 1000:>10.1f}{sum(values):>10.2f}"
+            )
+
+        throttled = sum(sum(values) for name, values in self.durations.items() if name.startswith("throttle."))
+        print(f"  Uploaded {self.counters['bytes_uploaded'] / 1e6:.2f} MB, throttled for {throttled:.1f}s")
+        other_counters = {name: value for name, value in sorted(self.counters.items()) if name != "bytes_uploaded"}
+        if other_counters:
+            print("  " + ", ".join(f"{name}: {value}" for name, value in other_counters.items()))
+        if self.jsonl_path:
+            print(f"  Spans written to {self.jsonl_path}")
+
+    def close(self):
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+
+
+_timings = None
+
+
+def get_timings():
+    """
+    Returns the process-wide Timings, shared by the parser, the bots and the
+    rate limiters.
+    """
+    global _timings
+    if _timings is None:
+        _timings = Timings(os.getenv("TIMINGS_JSONL") or None)
+    return _timings
@@ -1,81 +1,268 @@
+import argparse
 import asyncio
-from extract_content import DocxParser
-from telegram_bot import TelegramBot
-from Bale_Bot import BaleBot
+import datetime
+import multiprocessing
 import os
+from dotenv import load_dotenv
+from publisher import Publisher
+from send_journal import SendJournal, destination_key
+from parse_cache import ParseCache
+from instrumentation import get_timings
 
-async def send_to_telegram(content_with_images):
+async def send_to_telegram(content_with_images, journal=None, document_id=None, document_name=None):
     print("Sending content and images to Telegram...")
     try:
-        bot = TelegramBot()
-        for section in content_with_images:
-            await bot.send_message_with_images(section['text'], section['images'])
+        publisher = Publisher(build_destinations('T'), journal)
+        await publisher.publish(content_with_images, document_id, document_name)
         print("All content and images sent successfully to Telegram!")
     except Exception as e:
         print(f"Error sending messages to Telegram: {e}")
 
 
-async def send_to_bale(content_with_images):
+async def send_to_bale(content_with_images, journal=None, document_id=None, document_name=None):
     print("Sending content and images to Bale...")
     try:
-        bale_bot = BaleBot()
-        for section in content_with_images:
-            text = section["text"]
-            images = section.get("images", [])
-
-            if images:
-                for image in images:
-                    # Validate image path
-                    image_path = os.path.abspath(image)
-                    if not os.path.exists(image_path):
-                        print(f"Error: Image not found at {image_path}")
-                        continue
-                    if not os.access(image_path, os.R_OK):
-                        print(f"Error: Image not readable at {image_path}")
-                        continue
-
-                    print(f"Sending text: {text} with image: {image_path}")
-                    await bale_bot.run(text, photo_path=image_path)
-                    text = ""  # Avoid duplicate captions
-            else:
-                print(f"Sending text-only: {text}")
-                await bale_bot.run(text)
-
+        publisher = Publisher(build_destinations('B'), journal)
+        await publisher.publish(content_with_images, document_id, document_name)
         print("All content and images sent successfully to Bale!")
     except Exception as e:
         print(f"Error sending messages to Bale: {e}")
 
 
+async def send_to_all(content_with_images, journal=None, document_id=None, document_name=None):
+    print("Sending content and images to Telegram and Bale...")
+    try:
+        publisher = Publisher(build_destinations('A'), journal)
+        await publisher.publish(content_with_images, document_id, document_name)
+        print("All content and images sent to Telegram and Bale!")
+    except Exception as e:
+        print(f"Error sending messages: {e}")
+
+
+def destination_chats(choice):
+    """
+    Returns (destination name, platform, chat id) for every chat a choice
+    ('T', 'B' or 'A') sends to. TELEGRAM_CHAT_ID and BALE_CHAT_ID may list
+    several chats separated by commas, e.g. regional channels; a single
+    chat is simply called "Telegram" or "Bale".
+    """
+    chats = []
+    for platform, variable in (("Telegram", "TELEGRAM_CHAT_ID"), ("Bale", "BALE_CHAT_ID")):
+        if choice not in (platform[0], 'A'):
+            continue
+        chat_ids = [chat_id.strip() for chat_id in os.getenv(variable, "").split(",") if chat_id.strip()]
+        if len(chat_ids) > 1:
+            chats.extend((f"{platform} {chat_id}", platform, chat_id) for chat_id in chat_ids)
+        else:
+            chats.append((platform, platform, chat_ids[0] if chat_ids else None))
+    return chats
+
+
+def build_destinations(choice):
+    """
+    Returns the bots for a destination choice, one per chat. Each
+    platform's client library is only imported when it is chosen. Chats of
+    one platform share the bot token, so an image uploaded to the first
+    chat is sent to the others by file_id.
+    """
+    destinations = {}
+    for name, platform, chat_id in destination_chats(choice):
+        if platform == "Telegram":
+            from telegram_bot import TelegramBot
+            destinations[name] = TelegramBot(chat_id=chat_id)
+        else:
+            from Bale_Bot import BaleBot
+            destinations[name] = BaleBot(chat_id=chat_id)
+    return destinations
+
+
+def create_optimizer():
+    """
+    Returns an ImageOptimizer when OPTIMIZE_IMAGES is set, otherwise None.
+    """
+    if os.getenv("OPTIMIZE_IMAGES", "").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        from image_optimizer import ImageOptimizer
+        return ImageOptimizer()
+    except ImportError as e:
+        print(f"Image optimization disabled: {e}")
+        return None
+
+
+def save_images_enabled():
+    # Images stay in memory unless SAVE_EXTRACTED_IMAGES asks for copies on disk
+    return os.getenv("SAVE_EXTRACTED_IMAGES", "").lower() in ("1", "true", "yes")
+
+
+async def watch(inbox_dir, choice):
+    """
+    Daemon mode: publishes every document dropped into inbox_dir.
+    """
+    from watch_folder import InboxWatcher
+
+    optimizer = create_optimizer()
+    try:
+        publisher = Publisher(build_destinations(choice), SendJournal())
+        watcher = InboxWatcher(inbox_dir, publisher, save_images=save_images_enabled(), optimizer=optimizer)
+        await watcher.run()
+    finally:
+        if optimizer:
+            optimizer.close()
+        get_timings().report()
+
+
+async def publish_bulk(paths, choice):
+    """
+    Bulk mode: parses many documents in parallel and publishes them in order.
+    """
+    from bulk_ingest import publish_documents
+
+    optimizer = create_optimizer()
+    try:
+        publisher = Publisher(build_destinations(choice), SendJournal())
+        await publish_documents(paths, publisher, save_images=save_images_enabled(), optimizer=optimizer)
+    finally:
+        if optimizer:
+            optimizer.close()
+        get_timings().report()
+
+
+def parse_start_time(value):
+    """
+    Turns "HH:MM" (the next such time) or "YYYY-MM-DD HH:MM" into epoch seconds.
+    """
+    if value is None:
+        return None
+    now = datetime.datetime.now()
+    try:
+        start = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M")
+    except ValueError:
+        clock = datetime.datetime.strptime(value, "%H:%M")
+        start = now.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+        if start < now:
+            start += datetime.timedelta(days=1)
+    return start.timestamp()
+
+
+async def publish_scheduled(paths, choice, every_minutes=None, start=None, until_empty=True, retry_failed=False):
+    """
+    Scheduled mode: queues the sections of each document one every
+    `every_minutes`, documents one after another, then sends the backlog as
+    it falls due. Without paths it only sends what is already queued. With
+    retry_failed, sections that failed for good are queued again first.
+    """
+    from bulk_ingest import collect_documents
+    from post_scheduler import PostScheduler
+
+    scheduler = PostScheduler(Publisher(build_destinations(choice), SendJournal()))
+    if retry_failed:
+        print(f"Queued {scheduler.retry_failed()} failed sections again.")
+    start_at = parse_start_time(start)
+    for path in collect_documents(paths):
+        start_at = start_at or datetime.datetime.now().timestamp()
+        try:
+            count = scheduler.schedule_document(path, start_at, every_minutes * 60)
+        except Exception as e:
+            print(f"Error scheduling {path}: {e}")
+            continue
+        first = datetime.datetime.fromtimestamp(start_at).strftime("%Y-%m-%d %H:%M")
+        print(f"Scheduled {count} sections of {os.path.basename(path)}, one every {every_minutes:g} minutes from {first}.")
+        start_at += count * every_minutes * 60
+
+    try:
+        await scheduler.run(until_empty=until_empty)
+    finally:
+        get_timings().report()
+
+
 async def main():
     # Path to the Word document
     file_path = input("Enter the path to your Word document: ").strip()
 
-    # Extract content and images
+    # Load the document; sections are extracted lazily while sending
     print("Extracting content and images from the Word document...")
     try:
-        parser = DocxParser(file_path)
-        content_with_images = parser.extract_headings_content_with_images()
+        document_id = SendJournal.document_id(file_path)  # Keys both the parse cache and the send journal
+        content_with_images = ParseCache().iter_sections(file_path, save_images=save_images_enabled(), document_id=document_id)
     except Exception as e:
         print(f"Error extracting content: {e}")
         return
 
     # Ask the user where to send the content
-    choice = input("Do you want to send the content to Telegram (T) or Bale (B)? ").strip().upper()
+    choice = input("Do you want to send the content to Telegram (T), Bale (B) or both (A)? ").strip().upper()
+    if choice not in ('T', 'B', 'A'):
+        print("Invalid choice. Please select 'T' for Telegram, 'B' for Bale or 'A' for both.")
+        return
+
+    # Offer to resume if this exact document was (partly) sent before
+    journal = SendJournal()
+    destinations = [destination_key(platform, chat_id) for _, platform, chat_id in destination_chats(choice)]
+    if journal.has_deliveries(document_id, destinations):
+        answer = input("This document was sent before. Resume where it stopped (R) or send everything again (N)? ").strip().upper()
+        if answer == 'N':
+            journal.reset(document_id, destinations)
+    # A revised version of a document sent before only edits and adds what changed
+    document_name = os.path.basename(file_path)
+    if any(journal.previous_revision(document_id, document_name, name) for name in destinations):
+        answer = input("An earlier version of this document was sent. Update only what changed (U) or send everything as new posts (N)? ").strip().upper()
+        if answer == 'N':
+            document_name = None
+
+    # Optionally shrink images on a process pool while sending
+    optimizer = create_optimizer()
+    if optimizer:
+        content_with_images = optimizer.optimize_sections(content_with_images)
 
     destination = ""
-    if choice == 'T':
-        await send_to_telegram(content_with_images)
-        destination = "t.me/mavazenews"
-    elif choice == 'B':
-        await send_to_bale(content_with_images)
-        destination = "@mavazenews"
-    else:
-        print("Invalid choice. Please select 'T' for Telegram or 'B' for Bale.")
-        return
+    try:
+        if choice == 'T':
+            await send_to_telegram(content_with_images, journal, document_id, document_name)
+            destination = "t.me/mavazenews"
+        elif choice == 'B':
+            await send_to_bale(content_with_images, journal, document_id, document_name)
+            destination = "@mavazenews"
+        else:
+            await send_to_all(content_with_images, journal, document_id, document_name)
+            destination = "t.me/mavazenews and @mavazenews"
+    finally:
+        if optimizer:
+            optimizer.close()
+
+    # Where the time went: parsing, uploads, flood-control waits
+    get_timings().report()
 
     # Final success message
     print(f"\nMessages have been successfully sent to {destination}.\n")
     input("Press Enter to close the window...")  # Wait for user input to close
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    multiprocessing.freeze_support()  # Needed for the process pool in the PyInstaller build
+    load_dotenv()
+
+    arg_parser = argparse.ArgumentParser(description="Send Word bulletins to Telegram and Bale.")
+    arg_parser.add_argument("documents", nargs="*", help=".docx files or folders to publish in one run")
+    arg_parser.add_argument("--watch", metavar="INBOX", help="keep running and publish every .docx dropped into INBOX")
+    arg_parser.add_argument("--to", choices=["T", "B", "A"], default="A", help="destination in watch and bulk mode (default: both)")
+    arg_parser.add_argument("--every", type=float, metavar="MINUTES", help="queue the documents' sections one every MINUTES instead of sending them at once")
+    arg_parser.add_argument("--start", help='when the first queued section goes out: "HH:MM" or "YYYY-MM-DD HH:MM" (default: now)')
+    arg_parser.add_argument("--scheduled", action="store_true", help="keep running and send queued sections as they fall due")
+    arg_parser.add_argument("--retry-failed", action="store_true", help="with --scheduled, first queue sections that failed again")
+    args = arg_parser.parse_args()
+
+    if args.every or args.scheduled:
+        # Queued sections survive restarts; run again with --scheduled to continue
+        try:
+            asyncio.run(publish_scheduled(args.documents if args.every else [], args.to, args.every, args.start,
+                                          until_empty=not args.scheduled, retry_failed=args.retry_failed))
+        except KeyboardInterrupt:
+            print("Stopped. Queued sections are kept; run with --scheduled to send them.")
+    elif args.watch:
+        try:
+            asyncio.run(watch(args.watch, args.to))
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+    elif args.documents:
+        asyncio.run(publish_bulk(args.documents, args.to))
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,50 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Fast-start build: `pyinstaller main_fast.spec` writes dist/main/ with main.exe
+# next to its libraries. Unlike the onefile build (main.spec), nothing is
+# unpacked to a temporary folder on every launch, and nothing is UPX-compressed,
+# so the first prompt shows up without delay. Ship the whole dist/main folder.
+# Compare the two with `python benchmarks/bench_startup.py --exe dist/main/main.exe`.
+
+
+a = Analysis(
+    ['main.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    # Standard library and tooling packages that none of the bot's code paths import
+    excludes=['tkinter', 'test', 'lib2to3', 'pydoc_data', 'distutils', 'setuptools', 'pip', 'IPython', 'matplotlib'],
+    noarchive=False,
+    optimize=1,  # Bundle .pyc compiled with -O; not -OO, libraries may read their docstrings
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='main',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main',
+)
@@ -0,0 +1,103 @@
+import gzip
+import json
+import os
+from image_blob import ImageBlob, ZipImagePart
+from instrumentation import get_timings
+from send_journal import SendJournal
+from section_rules import load_section_rules
+
+# Bump whenever the parsers' output changes, so stale cache entries are ignored
+PARSER_VERSION = 2
+
+
+def create_parser(file_path, save_images=False, rules=None):
+    """
+    Returns the streaming FastDocxParser, or the python-docx based DocxParser
+    (the reference implementation) when DOCX_PARSER=reference.
+    """
+    # Imported here so a cache hit loads neither parser
+    if os.getenv("DOCX_PARSER", "fast").lower() == "reference":
+        from extract_content import DocxParser
+        return DocxParser(file_path, save_images=save_images, rules=rules)
+    from extract_content_fast import FastDocxParser
+    return FastDocxParser(file_path, save_images=save_images, rules=rules)
+
+
+class ParseCache:
+    """
+    Caches the section list extracted from each document, keyed by the
+    document's content hash, PARSER_VERSION and the section rules.
+    Re-running an unchanged document (for example to retry a send) skips
+    parsing entirely.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.getenv("PARSE_CACHE_DIR", "parse_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, document_hash, save_images, rules):
+        mode = "files" if save_images else "memory"
+        return os.path.join(self.cache_dir, f"{document_hash}-v{PARSER_VERSION}-{rules.fingerprint()}-{mode}.json.gz")
+
+    def iter_sections(self, file_path, save_images=False, rules=None, document_id=None):
+        """
+        Returns an iterator over the document's sections, from the cache when
+        possible. Otherwise the document is loaded with create_parser (errors
+        are raised here, not while iterating) and the result is stored once
+        every section has been read. Pass the SendJournal.document_id the
+        caller already computed, so the file is not hashed twice.
+        """
+        rules = rules or load_section_rules()
+        document_id = document_id or SendJournal.document_id(file_path)
+        entry_path = self._entry_path(document_id, save_images, rules)
+        with get_timings().span("parse.cache_lookup"):
+            cached = self._load(entry_path, file_path)
+        if cached is not None:
+            print(f"Using cached sections for {file_path}")
+            return iter(cached)
+
+        with get_timings().span("parse.load"):
+            parser = create_parser(file_path, save_images=save_images, rules=rules)
+        return self._parse_and_store(parser, entry_path)
+
+    def _parse_and_store(self, parser, entry_path):
+        records = []
+        for section in get_timings().iter("parse.scan", parser.iter_sections()):
+            records.append({
+                "text": section["text"],
+                "images": [self._image_record(image) for image in section["images"]],
+            })
+            yield section
+        self._store(entry_path, records)
+
+    def _image_record(self, image):
+        if isinstance(image, ImageBlob):
+            return {"part": image.partname, "content_type": image.content_type, "sha256": image.content_hash}
+        return image
+
+    def _load(self, entry_path, file_path):
+        try:
+            with gzip.open(entry_path, "rt", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        sections = []
+        for record in records:
+            images = []
+            for image in record["images"]:
+                if isinstance(image, dict):
+                    part = ZipImagePart(file_path, image["part"], image["content_type"])
+                    images.append(ImageBlob(part, content_hash=image["sha256"]))
+                elif os.path.exists(image):
+                    images.append(image)
+                else:
+                    return None  # An extracted image was deleted; parse again
+            sections.append({"text": record["text"], "images": images})
+        return sections
+
+    def _store(self, entry_path, records):
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, entry_path)
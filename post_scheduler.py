@@ -0,0 +1,298 @@
+import asyncio
+import heapq
+import os
+import shutil
+import sqlite3
+import time
+from collections import OrderedDict
+from instrumentation import get_timings
+from parse_cache import ParseCache
+from send_journal import NO_JOURNAL, SendJournal
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+MAX_ATTEMPTS = int(os.getenv("SCHEDULE_MAX_ATTEMPTS", "3"))  # Sends of a post before it is marked failed
+RETRY_DELAY = float(os.getenv("SCHEDULE_RETRY_DELAY", "60"))  # Seconds before a failed post is tried again, doubling
+
+
+class ScheduleStore:
+    """
+    Persistent backlog of scheduled posts: one row per section, with the
+    time it is due, the destinations it goes to and how often sending it
+    has failed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SCHEDULE_PATH", "schedule.sqlite3")
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scheduled_posts ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, due_at REAL NOT NULL, document_id TEXT NOT NULL, "
+            "document_path TEXT NOT NULL, section_index INTEGER NOT NULL, destinations TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', sent_at REAL, error TEXT, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(scheduled_posts)")]
+        if "attempts" not in columns:
+            self.connection.execute("ALTER TABLE scheduled_posts ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS scheduled_posts_pending ON scheduled_posts (status, id)"
+        )
+        self.connection.commit()
+
+    def add(self, rows):
+        """
+        Stores (due_at, document_id, document_path, section_index, destinations)
+        rows and returns their ids.
+        """
+        ids = []
+        with self.connection:
+            for due_at, document_id, document_path, section_index, destinations in rows:
+                cursor = self.connection.execute(
+                    "INSERT INTO scheduled_posts (due_at, document_id, document_path, section_index, destinations) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (due_at, document_id, document_path, section_index, ",".join(destinations)),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def pending_after(self, last_id):
+        """
+        Returns (due_at, id) of the pending posts added after last_id.
+        """
+        return self.connection.execute(
+            "SELECT due_at, id FROM scheduled_posts WHERE status = ? AND id > ?", (PENDING, last_id)
+        ).fetchall()
+
+    def get(self, post_id):
+        return self.connection.execute(
+            "SELECT document_id, document_path, section_index, destinations, status, attempts FROM scheduled_posts WHERE id = ?",
+            (post_id,),
+        ).fetchone()
+
+    def finish(self, post_id, status, error=None):
+        self.connection.execute(
+            "UPDATE scheduled_posts SET status = ?, sent_at = ?, error = ? WHERE id = ?",
+            (status, time.time(), error, post_id),
+        )
+        self.connection.commit()
+
+    def retry(self, post_id, due_at, error):
+        """
+        Keeps a post whose send failed pending, due again at due_at.
+        """
+        self.connection.execute(
+            "UPDATE scheduled_posts SET due_at = ?, error = ?, attempts = attempts + 1 WHERE id = ?",
+            (due_at, error, post_id),
+        )
+        self.connection.commit()
+
+    def requeue_failed(self, due_at):
+        """
+        Makes every failed post pending again, due at due_at. Returns how many.
+        """
+        cursor = self.connection.execute(
+            "UPDATE scheduled_posts SET status = ?, due_at = ?, attempts = 0 WHERE status = ?",
+            (PENDING, due_at, FAILED),
+        )
+        self.connection.commit()
+        return cursor.rowcount
+
+    def pending_count(self, document_id=None, statuses=(PENDING,)):
+        placeholders = ",".join("?" for _ in statuses)
+        if document_id is None:
+            row = self.connection.execute(
+                f"SELECT COUNT(*) FROM scheduled_posts WHERE status IN ({placeholders})", statuses
+            ).fetchone()
+        else:
+            row = self.connection.execute(
+                f"SELECT COUNT(*) FROM scheduled_posts WHERE status IN ({placeholders}) AND document_id = ?",
+                (*statuses, document_id),
+            ).fetchone()
+        return row[0]
+
+    def close(self):
+        self.connection.close()
+
+
+class PostScheduler:
+    """
+    Drips the sections of documents out on a timetable, e.g. one every ten
+    minutes, and survives restarts.
+
+    The backlog lives in a ScheduleStore; in memory there is only a heap of
+    (due_at, id) pairs, so the next post is found in O(log n) however long
+    the backlog is. One asyncio task sleeps until the earliest post is due
+    (or a new one is scheduled), sends it through the publisher's bots and
+    marks it sent. Posts that fell due while the scheduler was not running
+    are sent as soon as it starts, in order.
+
+    Scheduled documents are copied into schedule_dir, so the original can be
+    edited or moved meanwhile. Deliveries go through the send journal, so a
+    crash between sending and marking a post never sends it twice.
+    """
+
+    def __init__(self, publisher, store=None, schedule_dir=None, sync_interval=30.0):
+        self.publisher = publisher
+        self.store = store or ScheduleStore()
+        self.schedule_dir = schedule_dir or os.getenv("SCHEDULE_DIR", "scheduled")
+        self.sync_interval = sync_interval  # How often to pick up posts scheduled by another process
+        self.parse_cache = ParseCache()
+        self.timings = get_timings()
+        self._heap = []  # (due_at, id) of every pending post
+        self._last_id = 0
+        self._documents = OrderedDict()  # document_id -> sections, for the few documents being dripped
+        self._wake = asyncio.Event()
+        os.makedirs(self.schedule_dir, exist_ok=True)
+
+    def schedule_document(self, file_path, start_at=None, interval=600.0, destinations=None):
+        """
+        Schedules every section of a document, the first at start_at (epoch
+        seconds, default now) and each next one `interval` seconds later.
+        Returns the number of sections scheduled.
+        """
+        destinations = destinations or list(self.publisher.destinations)
+        destinations = [self.publisher.destination_key(name) for name in destinations]  # Stable across renames
+        document_id = SendJournal.document_id(file_path)
+        document_path = os.path.join(self.schedule_dir, f"{document_id}.docx")
+        if not os.path.exists(document_path):
+            shutil.copyfile(file_path, document_path)
+
+        count = len(self._sections(document_id, document_path))
+        start_at = time.time() if start_at is None else start_at
+        self.store.add([
+            (start_at + index * interval, document_id, document_path, index, destinations)
+            for index in range(count)
+        ])
+        self._sync()
+        self._wake.set()
+        return count
+
+    def _sync(self):
+        """
+        Adds the pending posts the heap does not know about yet: all of them
+        at start-up, later those scheduled since (also by another process).
+        """
+        for due_at, post_id in self.store.pending_after(self._last_id):
+            heapq.heappush(self._heap, (due_at, post_id))
+            self._last_id = max(self._last_id, post_id)
+
+    def retry_failed(self):
+        """
+        Queues every post that failed for good to be sent again now. Returns
+        how many there were.
+        """
+        count = self.store.requeue_failed(time.time())
+        self._heap = []
+        self._last_id = 0
+        self._sync()  # Requeued posts keep their ids, so rebuild the heap
+        self._wake.set()
+        return count
+
+    async def run(self, until_empty=False):
+        """
+        Sends posts as they fall due. Runs until cancelled, or with
+        until_empty until the backlog is empty.
+        """
+        self._sync()
+        print(f"{len(self._heap)} scheduled posts pending.")
+        async with self.publisher:
+            next_sync = time.monotonic() + self.sync_interval
+            while True:
+                while self._heap and self._heap[0][0] <= time.time():
+                    due_at, post_id = heapq.heappop(self._heap)
+                    self.timings.record("schedule.lateness", max(0.0, time.time() - due_at))
+                    await self.dispatch(post_id)
+
+                if time.monotonic() >= next_sync:
+                    self._sync()
+                    next_sync = time.monotonic() + self.sync_interval
+                if until_empty and not self._heap:
+                    return
+
+                timeout = next_sync - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - time.time())
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), max(0.0, timeout))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch(self, post_id):
+        """
+        Sends one scheduled section to its destinations and records the outcome.
+        """
+        row = self.store.get(post_id)
+        if row is None or row[4] != PENDING:
+            return  # Cancelled or already handled by another scheduler
+        document_id, document_path, section_index, destinations, _, attempts = row
+
+        try:
+            section = self._sections(document_id, document_path)[section_index]
+        except Exception as e:
+            print(f"Error loading scheduled section {section_index} of {document_path}: {e}")
+            self.store.finish(post_id, FAILED, str(e))
+            return
+
+        results = await asyncio.gather(*(
+            self._send(key, document_id, section_index, section) for key in destinations.split(",")
+        ))
+        errors = [error for error in results if error]
+        if errors and attempts + 1 < MAX_ATTEMPTS:
+            # Destinations that already have it skip it through the journal
+            due_at = time.time() + RETRY_DELAY * 2 ** attempts
+            self.store.retry(post_id, due_at, "; ".join(errors))
+            heapq.heappush(self._heap, (due_at, post_id))
+            print(f"Scheduled section {section_index} failed, trying again in {due_at - time.time():.0f}s.")
+            return
+        self.store.finish(post_id, FAILED if errors else SENT, "; ".join(errors) or None)
+        print(f"Scheduled section {section_index} {'failed' if errors else 'sent'} ({len(self._heap)} pending).")
+
+        # Failed posts keep the copy too, for retry_failed()
+        if not self.store.pending_count(document_id, (PENDING, FAILED)):
+            self._documents.pop(document_id, None)
+            try:
+                os.remove(document_path)  # Every section of this document has been handled
+            except OSError:
+                pass
+
+    async def _send(self, key, document_id, section_index, section):
+        """
+        Returns None once the section is on the destination with journal key
+        `key`, otherwise the error.
+        """
+        names = {self.publisher.destination_key(name): name for name in self.publisher.destinations}
+        name = names.get(key, key if key in self.publisher.destinations else None)  # Posts queued by name before
+        if name is None:
+            return f"{key} is not configured"
+        bot = self.publisher.destinations[name]
+        if hasattr(bot, "retry_policy"):
+            bot.retry_policy.new_job()
+        delivery = NO_JOURNAL
+        if self.publisher.journal is not None:
+            delivery = self.publisher.journal.section(document_id, self.publisher.destination_key(name), section_index)
+        try:
+            with self.timings.span("schedule.dispatch"):
+                delivered = await bot.send_message_with_images(section["text"], section.get("images", []), delivery=delivery)
+        except Exception as e:
+            print(f"Error sending scheduled section to {name}: {e}")
+            return f"{name}: {e}"
+        if not delivered:  # The bot printed what failed
+            return f"{name}: some parts could not be sent"
+
+    def _sections(self, document_id, document_path):
+        """
+        Returns the sections of a scheduled document, parsed once (through
+        the parse cache) and kept for the next few posts.
+        """
+        if document_id in self._documents:
+            self._documents.move_to_end(document_id)
+            return self._documents[document_id]
+        sections = list(self.parse_cache.iter_sections(document_path))
+        self._documents[document_id] = sections
+        if len(self._documents) > 4:
+            self._documents.popitem(last=False)
+        return sections
@@ -0,0 +1,247 @@
+import asyncio
+import contextlib
+import os
+from collections import deque
+from image_blob import load_image
+from section_diff import match_revision, section_fingerprint
+from send_journal import NO_JOURNAL
+
+
+def stage_section(section):
+    """
+    Returns a copy of the section with every image loaded into memory. An
+    image that cannot be read is left as it is, for the bot to report.
+    """
+    images = []
+    for image in section.get("images", []):
+        try:
+            images.append(load_image(image))
+        except Exception:
+            images.append(image)
+    return {**section, "images": images}
+
+
+class Publisher:
+    """
+    Parses a document once and fans every section out to several bots.
+    Each destination has its own queue and worker, so a slow or
+    flood-limited platform never holds back the others.
+    """
+
+    def __init__(self, destinations, journal=None, pipeline_depth=None):
+        # Mapping of destination name -> bot exposing send_message_with_images
+        self.destinations = destinations
+        self.journal = journal  # Optional SendJournal for resumable runs
+        # Sections each worker stages ahead of the one it is sending
+        self.pipeline_depth = int(os.getenv("SEND_PIPELINE_DEPTH", "3")) if pipeline_depth is None else pipeline_depth
+        self._sessions = None  # Open while the publisher is used as a context manager
+
+    def destination_key(self, name):
+        """
+        Returns the send journal key of a destination: its platform and chat
+        id rather than its display name.
+        """
+        return getattr(self.destinations[name], "destination_key", name)
+
+    async def start(self):
+        """
+        Opens every bot's session. They stay open across publish() calls until
+        close(), so long-running jobs keep their connections warm.
+        """
+        if self._sessions is None:
+            sessions = contextlib.AsyncExitStack()
+            try:
+                for bot in self.destinations.values():
+                    await sessions.enter_async_context(bot)
+            except BaseException:
+                await sessions.aclose()  # Close the sessions that did open
+                raise
+            self._sessions = sessions
+
+    async def close(self):
+        if self._sessions is not None:
+            sessions, self._sessions = self._sessions, None
+            await sessions.aclose()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @contextlib.asynccontextmanager
+    async def _job(self):
+        """
+        Uses the open sessions, or opens them for a single publish() call.
+        """
+        if self._sessions is not None:
+            yield
+            return
+
+        await self.start()
+        try:
+            yield
+        finally:
+            await self.close()
+
+    async def publish(self, sections, document_id=None, document_name=None):
+        """
+        Feeds the sections into every destination queue and waits until all
+        workers have drained them. Returns the number of sections each
+        destination delivered.
+
+        With a journal and a document_id, every delivery is recorded and
+        anything recorded by an earlier run of the same document is skipped.
+        With a document_name as well (the file name), a revised document is
+        diffed against the revision last sent under that name: unchanged
+        sections are skipped, changed text is edited in place and only new
+        sections are sent.
+        """
+        async with self._job():
+            for bot in self.destinations.values():
+                if hasattr(bot, "retry_policy"):
+                    bot.retry_policy.new_job()
+            fingerprints = None
+            revisions = {}
+            if self.journal is not None and document_id is not None and document_name:
+                sections, fingerprints, revisions = await self._diff_revisions(sections, document_id, document_name)
+            queues = {name: asyncio.Queue() for name in self.destinations}
+            staged = {}  # index -> [staging task, workers yet to take it], shared by the workers
+            workers = [
+                asyncio.create_task(self._worker(name, bot, queues[name], document_id, revisions.get(name, {}), staged))
+                for name, bot in self.destinations.items()
+            ]
+
+            try:
+                await self._produce(sections, queues, document_id if document_name else None, fingerprints)
+            except Exception as e:
+                print(f"Error extracting content: {e}")
+            finally:
+                for queue in queues.values():
+                    queue.put_nowait(None)  # Tell the worker there is nothing left
+
+            results = await asyncio.gather(*workers)
+        return dict(zip(self.destinations, results))
+
+    async def _diff_revisions(self, sections, document_id, document_name):
+        """
+        Registers the document under its name and matches its sections with
+        the revision each destination last received. Returns the sections
+        (a list once they had to be read for the diff), their fingerprints if
+        computed, and {destination: {index: (previous document id, index)}}.
+        If the document fails to parse, the sections read before the error
+        are returned with no diff.
+        """
+        previous_ids = {
+            name: self.journal.previous_revision(document_id, document_name, self.destination_key(name))
+            for name in self.destinations
+        }
+        self.journal.register(document_id, document_name)
+        if not any(previous_ids.values()):
+            return sections, None, {}
+
+        parsed = []
+        try:
+            await asyncio.to_thread(parsed.extend, sections)  # Keeps what was read before a parse error
+            fingerprints = await asyncio.to_thread(lambda: [section_fingerprint(section) for section in parsed])
+        except Exception as e:
+            print(f"Error extracting content, publishing the {len(parsed)} sections read without diffing: {e}")
+            return parsed, None, {}
+        sections = parsed
+        revisions = {}
+        for name, previous_id in previous_ids.items():
+            if previous_id is None:
+                continue
+            matches = match_revision(self.journal.fingerprints(previous_id), fingerprints)
+            if matches:
+                print(f"{document_name} was sent to {name} before: {len(matches)} of {len(sections)} sections are kept or edited in place.")
+                revisions[name] = {index: (previous_id, previous_index) for index, previous_index in matches.items()}
+        return sections, fingerprints, revisions
+
+    async def _produce(self, sections, queues, document_id=None, fingerprints=None):
+        """
+        Pulls sections from the parser in a worker thread so the event loop
+        keeps sending while the next section is being extracted. With a
+        document_id, each section's fingerprint is journaled for diffing
+        later revisions.
+        """
+        iterator = iter(sections)
+        index = 0
+        while True:
+            section = await asyncio.to_thread(next, iterator, None)
+            if section is None:
+                break
+            if document_id is not None:
+                fingerprint = fingerprints[index] if fingerprints else await asyncio.to_thread(section_fingerprint, section)
+                self.journal.record_fingerprint(document_id, index, *fingerprint)
+            for queue in queues.values():
+                queue.put_nowait((index, section))
+            index += 1
+
+    def _stage(self, staged, index, section):
+        """
+        Returns the task loading the section's images. Workers within
+        pipeline_depth sections of the first one to get to a section share
+        its task, so the section is read into memory once. A worker further
+        behind, e.g. a flood-limited destination, loads its own copy rather
+        than have the others keep every section they sent meanwhile.
+        """
+        entry = staged.get(index)
+        if entry is None:
+            entry = staged[index] = [asyncio.create_task(asyncio.to_thread(stage_section, section)), len(self.destinations)]
+            for old_index in [old_index for old_index in staged if old_index < index - self.pipeline_depth]:
+                del staged[old_index]  # Out of the window; lagging workers stage it again
+        entry[1] -= 1
+        if not entry[1]:
+            del staged[index]  # Every worker has it now
+        return entry[0]
+
+    async def _worker(self, name, bot, queue, document_id=None, revision=None, staged=None):
+        """
+        Sends queued sections to one destination in order. While a section
+        is being sent, the images of the next pipeline_depth sections are
+        loaded in worker threads, so each request starts without reading
+        anything. Only the sends themselves stay strictly one at a time.
+        `revision` maps section indexes to their place in an earlier
+        revision of the document; `staged` holds the staging shared with
+        the other workers.
+        """
+        revision = revision or {}
+        staged = {} if staged is None else staged
+        sent = 0
+        ahead = deque()  # (index, section, staging task), in order
+        finished = False
+        while True:
+            while not finished and len(ahead) <= self.pipeline_depth:
+                if ahead:
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break  # Send what is ready instead of waiting for the parser
+                else:
+                    item = await queue.get()
+                if item is None:
+                    finished = True
+                    break
+                index, section = item
+                ahead.append((index, section, self._stage(staged, index, section)))
+            if not ahead:
+                break
+
+            index, section, staging = ahead.popleft()
+            try:
+                section = await staging
+            except Exception as e:
+                print(f"Error staging section {index}, sending it as it is: {e}")
+            delivery = NO_JOURNAL
+            if self.journal is not None and document_id is not None:
+                delivery = self.journal.section(document_id, self.destination_key(name), index, previous=revision.get(index))
+            try:
+                if await bot.send_message_with_images(section["text"], section.get("images", []), delivery=delivery):
+                    sent += 1
+            except Exception as e:
+                print(f"Error sending section to {name}: {e}")
+
+        print(f"{sent} sections sent to {name}.")
+        return sent
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from instrumentation import get_timings
+
+# Default (messages per second, burst size) per platform. Override them in .env
+# with e.g. TELEGRAM_RATE_LIMIT=0.5 and TELEGRAM_RATE_BURST=2.
+DEFAULT_RATES = {
+    "telegram": (1.0, 3),
+    "bale": (1.0, 1),
+}
+
+
+class TokenBucket:
+    """
+    Token bucket for a single chat. Refills `rate` tokens per second up to
+    `capacity`; every API call takes one token.
+
+    The rate adapts to the platform: a Retry-After halves it and blocks the
+    bucket for the requested time, and each successful send raises it again
+    a little, so the sustained rate settles just under the real limit.
+    """
+
+    RECOVERY_STEP = 0.05  # Fraction of the configured rate regained per success
+    MIN_RATE_FRACTION = 0.1  # Never slow down below 10% of the configured rate
+
+    def __init__(self, rate, capacity):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    with get_timings().span("throttle.retry_after"):
+                        await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                with get_timings().span("throttle.rate_limit"):
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, retry_after):
+        """
+        Records a flood-control response: empties the bucket, blocks it for
+        `retry_after` seconds and halves the sending rate.
+        """
+        now = time.monotonic()
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.updated = max(self.updated, self.blocked_until)  # No refill while blocked
+        self.rate = max(self.rate / 2, self.max_rate * self.MIN_RATE_FRACTION)
+
+    def reward(self):
+        """
+        Records a successful send and slowly restores the configured rate.
+        """
+        self.rate = min(self.max_rate, self.rate + self.max_rate * self.RECOVERY_STEP)
+
+
+class RateLimiter:
+    """
+    Keeps one TokenBucket per chat for a platform.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    def bucket(self, chat_id):
+        chat_id = str(chat_id)
+        if chat_id not in self.buckets:
+            self.buckets[chat_id] = TokenBucket(self.rate, self.burst)
+        return self.buckets[chat_id]
+
+    async def acquire(self, chat_id):
+        await self.bucket(chat_id).acquire()
+
+    def penalize(self, chat_id, retry_after):
+        self.bucket(chat_id).penalize(retry_after)
+
+    def reward(self, chat_id):
+        self.bucket(chat_id).reward()
+
+
+_limiters = {}
+
+
+def get_rate_limiter(platform):
+    """
+    Returns the shared RateLimiter for a platform ("telegram" or "bale"),
+    so every bot instance of that platform draws from the same buckets.
+    """
+    if platform not in _limiters:
+        default_rate, default_burst = DEFAULT_RATES[platform]
+        rate = float(os.getenv(f"{platform.upper()}_RATE_LIMIT", default_rate))
+        burst = int(os.getenv(f"{platform.upper()}_RATE_BURST", default_burst))
+        _limiters[platform] = RateLimiter(rate, burst)
+    return _limiters[platform]
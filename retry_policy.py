@@ -0,0 +1,95 @@
+import asyncio
+import os
+import random
+from instrumentation import get_timings
+
+# What classify() returns for an exception
+FLOOD = "flood"  # The platform asked us to slow down; wait retry_after seconds
+TRANSIENT = "transient"  # Network trouble; back off exponentially and try again
+
+
+class RetryBudgetExceeded(Exception):
+    """
+    Raised instead of retrying once a job has spent its retry budget.
+    """
+
+
+class RetryPolicy:
+    """
+    One retry loop for every API call of a bot.
+
+    Each call takes a token from the rate limiter and is retried when the
+    bot's classify(exception) says so:
+
+      * FLOOD, with the retry_after the library reported: the chat's bucket
+        is blocked for that long (plus a little jitter) and its rate halved;
+      * TRANSIENT: full-jitter exponential backoff, base_delay * 2^attempt
+        capped at max_delay.
+
+    Anything else is raised at once. A call gives up after max_attempts,
+    and a job (one publish) gives up retrying once it has spent
+    budget_seconds waiting, so a throttled run slows down but never hangs.
+    """
+
+    def __init__(self, platform, rate_limiter, classify, max_attempts=None, base_delay=1.0, max_delay=30.0,
+                 budget_seconds=None):
+        self.platform = platform
+        self.rate_limiter = rate_limiter
+        self.classify = classify  # exception -> (FLOOD, seconds) | (TRANSIENT, None) | None
+        self.max_attempts = max_attempts or int(os.getenv("RETRY_MAX_ATTEMPTS", "8"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_seconds = budget_seconds or float(os.getenv("RETRY_BUDGET_SECONDS", "900"))
+        self.spent = 0.0  # Seconds of waiting charged to the current job
+        self.timings = get_timings()
+
+    def new_job(self):
+        """
+        Gives the next job a full retry budget.
+        """
+        self.spent = 0.0
+
+    async def call(self, chat_id, send, span_name):
+        """
+        Awaits send() with rate limiting and retries, and returns its result.
+        """
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(chat_id)
+            try:
+                with self.timings.span(span_name):
+                    result = await send()
+                self.rate_limiter.reward(chat_id)
+                return result
+            except Exception as e:
+                verdict = self.classify(e)
+                if verdict is None:
+                    raise
+                attempt += 1
+                kind, retry_after = verdict
+                delay = self._delay(kind, retry_after, attempt)
+                if attempt >= self.max_attempts:
+                    print(f"Giving up on {span_name} after {attempt} attempts: {e}")
+                    raise
+                if self.spent + delay > self.budget_seconds:
+                    self.timings.count(f"{self.platform}.retry_budget_exhausted")
+                    raise RetryBudgetExceeded(
+                        f"{span_name} failed and the job's {self.budget_seconds:.0f}s retry budget is spent: {e}"
+                    ) from e
+                self.spent += delay
+
+                if kind == FLOOD:
+                    print(f"Flood control exceeded. Retrying in {delay:.1f} seconds...")
+                    self.timings.count(f"{self.platform}.flood_control")
+                    self.rate_limiter.penalize(chat_id, delay)  # The next acquire() waits it out
+                else:
+                    print(f"{span_name} failed ({e}). Retrying in {delay:.1f} seconds...")
+                    self.timings.count(f"{self.platform}.transient_retries")
+                    with self.timings.span("throttle.backoff"):
+                        await asyncio.sleep(delay)
+
+    def _delay(self, kind, retry_after, attempt):
+        if kind == FLOOD:
+            # Jitter keeps several bots that were throttled together from retrying in lockstep
+            return retry_after * random.uniform(1.0, 1.1)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
@@ -0,0 +1,57 @@
+import difflib
+import hashlib
+import os
+from image_blob import image_hash
+
+# Share of the earlier revision's sections that must reappear, unchanged or
+# with only their text edited, before a document counts as its revision; a new
+# bulletin saved under yesterday's file name is published from scratch instead
+# of overwriting yesterday's posts.
+REVISION_MIN_UNCHANGED = float(os.getenv("REVISION_MIN_UNCHANGED", "0.5"))
+
+# Media fingerprint of a section without attachments
+NO_MEDIA = hashlib.sha256().hexdigest()
+
+
+def section_fingerprint(section):
+    """
+    Returns (fingerprint, media fingerprint) of a section: hashes of its text
+    and attachments together, and of its attachments alone. Slow for large
+    attachments that were not hashed yet, meant for a worker thread.
+    """
+    media = hashlib.sha256()
+    for image in section.get("images", []):
+        media.update(image_hash(image).encode("ascii"))
+    media_fingerprint = media.hexdigest()
+    fingerprint = hashlib.sha256(f"{media_fingerprint}\n{section['text']}".encode("utf-8")).hexdigest()
+    return fingerprint, media_fingerprint
+
+
+def match_revision(previous, current, min_unchanged=REVISION_MIN_UNCHANGED):
+    """
+    Diffs the section fingerprints of a revised document against the
+    revision sent before. Returns {current index: previous index} for
+    sections that are unchanged or only differ in text, which are kept or
+    edited in place; every other section is sent as new. Returns {} when
+    too few sections are kept for the two to be revisions of one document:
+    unchanged sections count, and so do edited ones with the same
+    attachments. Text-only sections all share one media fingerprint, so an
+    edited text-only section does not count.
+    """
+    matcher = difflib.SequenceMatcher(None, [f for f, _ in previous], [f for f, _ in current], autojunk=False)
+    matches = {}
+    kept = 0
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            matches.update(zip(range(new_start, new_end), range(old_start, old_end)))
+            kept += old_end - old_start
+        elif tag == "replace":
+            # Sections replaced one for one keep their place; their text can be edited if the attachments match
+            for old_index, new_index in zip(range(old_start, old_end), range(new_start, new_end)):
+                if previous[old_index][1] == current[new_index][1]:
+                    matches[new_index] = old_index
+                    if current[new_index][1] != NO_MEDIA:
+                        kept += 1
+    if not previous or kept < min_unchanged * len(previous):
+        return {}
+    return matches
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+
+# What a paragraph style does; a style may combine CONTEXT with CLOSE or START
+BODY = 0  # Text and images of the open section
+CONTEXT = 1  # Its text becomes the context ({context}) of the sections that follow
+CLOSE = 2  # Ends the open section
+START = 4  # Ends the open section and starts a new one titled with its text
+
+PRESETS = {
+    # Heading 4 stories under the latest Heading 1 desk name (extract_content.py)
+    "default": {
+        "start_styles": ["Heading 4"],
+        "close_styles": ["Heading 1"],
+        "context_styles": ["Heading 1"],
+        "fallback_title": "خبر!",
+        # Header above the section text, depending on what ended the section
+        "headers": {"start": "#{context}", "close": "{context}", "end": "{context}"},
+    },
+    # Heading 4 stories ended by any higher heading, no desk name (was extract_content_headings.py)
+    "headings": {
+        "start_styles": ["Heading 4"],
+        "close_styles": ["Heading 1", "Heading 2", "Heading 3"],
+        "fallback_title": "خبر!",
+    },
+    # Heading 4 stories only (was extract_content_old_ver.py)
+    "heading4": {
+        "start_styles": ["Heading 4"],
+        "fallback_title": "خبر!",
+    },
+}
+
+
+class SectionRules:
+    """
+    Declarative description of how a desk's template is split into sections:
+    which paragraph styles start a section, which close it, which provide
+    the context (desk name / hashtag) shown above it, and the title used
+    when a section heading is empty.
+
+    The parsers compile the rules once into a style -> action table and
+    feed their paragraphs to build_sections().
+    """
+
+    def __init__(self, start_styles, close_styles=(), context_styles=(), fallback_title="خبر!", headers=None):
+        self.start_styles = list(start_styles)
+        self.close_styles = list(close_styles)
+        self.context_styles = list(context_styles)
+        self.fallback_title = fallback_title
+        headers = headers or {}
+        self.headers = {moment: headers.get(moment, "{context}") for moment in ("start", "close", "end")}
+        if not self.start_styles:
+            raise ValueError("Section rules need at least one start style")
+
+    @classmethod
+    def from_config(cls, config):
+        unknown = set(config) - {"start_styles", "close_styles", "context_styles", "fallback_title", "headers"}
+        if unknown:
+            raise ValueError(f"Unknown section rule keys: {', '.join(sorted(unknown))}")
+        return cls(**config)
+
+    def to_config(self):
+        return {
+            "start_styles": self.start_styles,
+            "close_styles": self.close_styles,
+            "context_styles": self.context_styles,
+            "fallback_title": self.fallback_title,
+            "headers": self.headers,
+        }
+
+    def fingerprint(self):
+        """
+        Short hash of the rules, so cached sections are tied to the rules
+        that produced them.
+        """
+        config = json.dumps(self.to_config(), ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(config.encode("utf-8")).hexdigest()[:12]
+
+    def action(self, style_name):
+        action = BODY
+        if style_name in self.context_styles:
+            action |= CONTEXT
+        if style_name in self.start_styles:
+            action |= START
+        elif style_name in self.close_styles:
+            action |= CLOSE
+        return action
+
+    def compile(self, style_names, default_style_name=None):
+        """
+        Turns a style id -> style name mapping into a style id -> action
+        table, plus the action of unstyled paragraphs.
+        """
+        table = {style_id: self.action(name) for style_id, name in style_names.items()}
+        return table, self.action(default_style_name)
+
+    def build_sections(self, paragraphs):
+        """
+        Yields {"text", "images"} sections from (action, text, images)
+        tuples. `images` may be a lazy iterable; it is only consumed for
+        paragraphs inside a section.
+        """
+        content = None
+        images = []
+        context = ""
+        collecting = False
+
+        for action, text, paragraph_images in paragraphs:
+            if action == BODY:
+                if collecting:
+                    text = text.strip()
+                    if text:
+                        content += "\n" + text
+                    images.extend(paragraph_images)
+                continue
+
+            if action & CONTEXT:
+                context = text.strip()
+            if action & (START | CLOSE):
+                if collecting and (content or images):
+                    yield self._section("start" if action & START else "close", context, content, images)
+                collecting = False
+                content = None
+                images = []
+            if action & START:
+                content = text.strip() or self.fallback_title
+                collecting = True
+
+        if collecting and (content or images):
+            yield self._section("end", context, content, images)
+
+    def _section(self, moment, context, content, images):
+        header = self.headers[moment].format(context=context)
+        enriched_text = f"{header}\n\n{content.strip() if content else self.fallback_title}"
+        return {"text": enriched_text.strip(), "images": images}
+
+
+def load_section_rules(source=None):
+    """
+    Returns the SectionRules named by `source` or the SECTION_RULES setting:
+    a preset name ("default", "headings", "heading4") or the path of a JSON
+    file with the same keys as the presets.
+    """
+    source = source or os.getenv("SECTION_RULES", "default")
+    if source in PRESETS:
+        return SectionRules.from_config(PRESETS[source])
+    with open(source, encoding="utf-8") as f:
+        return SectionRules.from_config(json.load(f))
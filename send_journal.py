@@ -0,0 +1,276 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+
+def _message_ids(result):
+    """
+    Returns the message id(s) of an API result as a string: a message, a list
+    of messages (albums) or Bale's raw album result dicts.
+    """
+    if isinstance(result, (list, tuple)):
+        return ",".join(_message_ids(item) for item in result)
+    if isinstance(result, dict):
+        return str(result.get("message_id", ""))
+    return str(getattr(result, "message_id", ""))
+
+
+def destination_key(platform, chat_id):
+    """
+    Returns the key deliveries to one chat are journaled under, e.g.
+    "telegram:-1001234". It follows the chat itself, so renaming a
+    destination or pointing it at another channel never mixes histories.
+    """
+    return f"{platform.lower()}:{chat_id}"
+
+
+def _text_hash(text):
+    return None if text is None else hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SendJournal:
+    """
+    Durable record of what has been delivered for each document, so a run
+    that stopped halfway can resume without re-posting anything.
+
+    Every delivered part of a section (a text chunk, a photo or an album) is
+    stored with the message id(s) it produced and a hash of the text it
+    carried, keyed by the document's content hash, the destination chat
+    (see destination_key) and the section index. Documents are also registered under their file name with
+    a fingerprint per section, so a revised document can be diffed against
+    the revision sent before it (see section_diff.py).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SEND_JOURNAL_PATH", "send_journal.sqlite3")
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes, cheap commits in WAL mode
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            "document_id TEXT NOT NULL, destination TEXT NOT NULL, section_index INTEGER NOT NULL, "
+            "part TEXT NOT NULL, message_ids TEXT NOT NULL, sent_at REAL NOT NULL, "
+            "PRIMARY KEY (document_id, destination, section_index, part))"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(deliveries)")]
+        if "text_hash" not in columns:
+            self.connection.execute("ALTER TABLE deliveries ADD COLUMN text_hash TEXT")  # Journals from older versions
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id TEXT PRIMARY KEY, name TEXT NOT NULL, registered_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS documents_by_name ON documents (name, registered_at)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS section_fingerprints ("
+            "document_id TEXT NOT NULL, section_index INTEGER NOT NULL, "
+            "fingerprint TEXT NOT NULL, media_fingerprint TEXT NOT NULL, "
+            "PRIMARY KEY (document_id, section_index))"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def document_id(file_path):
+        """
+        Identifies a document by the SHA-256 of its contents.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def has_deliveries(self, document_id, destinations):
+        placeholders = ",".join("?" for _ in destinations)
+        row = self.connection.execute(
+            f"SELECT 1 FROM deliveries WHERE document_id = ? AND destination IN ({placeholders}) LIMIT 1",
+            (document_id, *destinations),
+        ).fetchone()
+        return row is not None
+
+    def reset(self, document_id, destinations):
+        """
+        Forgets earlier deliveries so the document is sent again from the start.
+        """
+        placeholders = ",".join("?" for _ in destinations)
+        self.connection.execute(
+            f"DELETE FROM deliveries WHERE document_id = ? AND destination IN ({placeholders})",
+            (document_id, *destinations),
+        )
+        self.connection.commit()
+
+    def register(self, document_id, name):
+        """
+        Records that the document is being published under a file name, the
+        key that links a revised document to the revision sent before it.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO documents (document_id, name, registered_at) VALUES (?, ?, ?)",
+            (document_id, name, time.time()),
+        )
+        self.connection.commit()
+
+    def previous_revision(self, document_id, name, destination):
+        """
+        Returns the id of the latest other document registered under `name`
+        that was delivered to `destination`, or None.
+        """
+        row = self.connection.execute(
+            "SELECT d.document_id FROM documents d WHERE d.name = ? AND d.document_id != ? "
+            "AND EXISTS (SELECT 1 FROM deliveries WHERE document_id = d.document_id AND destination = ?) "
+            "ORDER BY d.registered_at DESC LIMIT 1",
+            (name, document_id, destination),
+        ).fetchone()
+        return row[0] if row else None
+
+    def record_fingerprint(self, document_id, section_index, fingerprint, media_fingerprint):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO section_fingerprints "
+            "(document_id, section_index, fingerprint, media_fingerprint) VALUES (?, ?, ?, ?)",
+            (document_id, section_index, fingerprint, media_fingerprint),
+        )
+        self.connection.commit()
+
+    def fingerprints(self, document_id):
+        """
+        Returns the (fingerprint, media fingerprint) of every section of a
+        document, in order.
+        """
+        return self.connection.execute(
+            "SELECT fingerprint, media_fingerprint FROM section_fingerprints "
+            "WHERE document_id = ? ORDER BY section_index",
+            (document_id,),
+        ).fetchall()
+
+    def section(self, document_id, destination, section_index, previous=None):
+        """
+        Returns the SectionLog the bots use while sending one section.
+        `previous` is the (document id, section index) of the same section in
+        an earlier revision; its messages are then kept or edited instead of
+        being sent again.
+        """
+        rows = self.connection.execute(
+            "SELECT part, message_ids FROM deliveries "
+            "WHERE document_id = ? AND destination = ? AND section_index = ?",
+            (document_id, destination, section_index),
+        ).fetchall()
+        previous_parts = {}
+        if previous is not None:
+            previous_parts = {
+                part: (message_ids, text_hash)
+                for part, message_ids, text_hash in self.connection.execute(
+                    "SELECT part, message_ids, text_hash FROM deliveries "
+                    "WHERE document_id = ? AND destination = ? AND section_index = ?",
+                    (previous[0], destination, previous[1]),
+                )
+            }
+        return SectionLog(self, document_id, destination, section_index, dict(rows), previous_parts)
+
+    def record(self, document_id, destination, section_index, part, message_ids, text_hash=None):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO deliveries "
+            "(document_id, destination, section_index, part, message_ids, sent_at, text_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (document_id, destination, section_index, part, message_ids, time.time(), text_hash),
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class SectionLog:
+    """
+    Journal entries of one section on one destination. The bots name every
+    API call with a part key ("text:1", "photo:3", "album:0") and go through
+    send(), which skips parts that were already delivered. When the section
+    was published before in an earlier revision of the document, parts
+    whose text is unchanged keep their messages and changed text is edited
+    in place.
+    """
+
+    def __init__(self, journal, document_id, destination, section_index, sent, previous=None):
+        self.journal = journal
+        self.document_id = document_id
+        self.destination = destination
+        self.section_index = section_index
+        self.sent = sent  # Part -> message ids
+        self.previous = previous or {}  # Part -> (message ids, text hash) in the earlier revision
+
+    def is_sent(self, part):
+        return part in self.sent
+
+    def was_sent(self, part):
+        """
+        True if the part was delivered by this run or an earlier revision.
+        """
+        return part in self.sent or part in self.previous
+
+    def record(self, part, result, text=None):
+        message_ids = result if isinstance(result, str) else _message_ids(result)
+        self.sent[part] = message_ids
+        self.journal.record(self.document_id, self.destination, self.section_index, part, message_ids, _text_hash(text))
+
+    async def revise(self, part, text, edit=None):
+        """
+        Reuses the part's message from the earlier revision: kept as it is
+        when its text is unchanged, otherwise edit(message_id) replaces the
+        text. Returns False when there is nothing to reuse or the edit
+        failed, so the caller sends the part as new.
+        """
+        if part not in self.previous:
+            return False
+        message_ids, text_hash = self.previous[part]
+        if text is not None and text_hash != _text_hash(text):
+            if edit is None:
+                return False
+            print(f"Editing section {self.section_index} {part} on {self.destination}")
+            try:
+                await edit(int(message_ids.split(",")[0]))  # A caption lives on an album's first message
+            except Exception as e:
+                print(f"Error editing section {self.section_index} {part} on {self.destination}, sending it again: {e}")
+                return False
+        self.record(part, message_ids, text)
+        return True
+
+    async def send(self, part, send, text=None, edit=None):
+        """
+        Awaits send() unless `part` was delivered before, and records the
+        message id(s) it returns. With an earlier revision, a part sent then
+        is revised instead: `text` is what the part carries and `edit` is
+        called with the old message id if it changed.
+        """
+        if part in self.sent:
+            print(f"Skipping section {self.section_index} {part} on {self.destination}: already sent")
+            return self.sent[part]
+        if await self.revise(part, text, edit):
+            return self.sent[part]
+
+        result = await send()
+        if result is not None:
+            self.record(part, result, text)
+        return result
+
+
+class _NoJournal:
+    """
+    Stand-in used when sending without a journal.
+    """
+
+    def is_sent(self, part):
+        return False
+
+    def was_sent(self, part):
+        return False
+
+    def record(self, part, result, text=None):
+        pass
+
+    async def revise(self, part, text, edit=None):
+        return False
+
+    async def send(self, part, send, text=None, edit=None):
+        return await send()
+
+
+NO_JOURNAL = _NoJournal()
@@ -1,128 +1,333 @@
-import asyncio
-from telegram import Bot, InputFile
+import contextlib
+import datetime
+import warnings
+from telegram import Bot, InputFile, InputMediaPhoto
+from telegram.error import BadRequest, NetworkError, RetryAfter
 import os
 from dotenv import load_dotenv
-import re
-
-load_dotenv()
+from rate_limiter import get_rate_limiter
+from file_id_cache import get_file_id_cache
+from image_blob import as_image_blob, image_filename, image_hash, image_size, media_kind, open_image, split_media
+from send_journal import NO_JOURNAL, destination_key
+from instrumentation import get_timings
+from retry_policy import RetryPolicy, FLOOD, TRANSIENT
+from text_splitter import TextSplitter, utf16_length, DEFAULT_CONTINUATION_START, DEFAULT_CONTINUATION_END
 
 class TelegramBot:
     MAX_CAPTION_LENGTH = 1024  # Telegram's caption character limit
     MAX_MESSAGE_LENGTH = 4000  # Safer limit than 4096
+    MAX_MEDIA_GROUP_SIZE = 10  # Telegram's album size limit
 
-    def __init__(self, continuation_notation=None):
+    def __init__(self, continuation_notation=None, chat_id=None):
+        load_dotenv()  # Read .env when a bot is created, not when this module is imported
         self.token = os.getenv("TELEGRAM_API_TOKEN")
-        self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
+        # TELEGRAM_CHAT_ID may list several chats; main.py creates one bot per chat
+        self.chat_id = chat_id or os.getenv("TELEGRAM_CHAT_ID", "").split(",")[0].strip()
         if not self.token or not self.chat_id:
             raise ValueError("TELEGRAM_API_TOKEN and TELEGRAM_CHAT_ID must be set in .env")
-        self.bot = Bot(token=self.token)
+        self.destination_key = destination_key("telegram", self.chat_id)  # What the send journal files deliveries under
+        # A local Bot API server (or the benchmarks' fake one) can stand in for api.telegram.org
+        base_url = os.getenv("TELEGRAM_API_BASE_URL")
+        self.bot = Bot(token=self.token, base_url=base_url) if base_url else Bot(token=self.token)
+        self.rate_limiter = get_rate_limiter("telegram")
+        self.file_id_cache = get_file_id_cache()
+        self.cache_scope = f"telegram:{self.token.split(':')[0]}"  # file_ids belong to one bot
+        self.timings = get_timings()
+        self.retry_policy = RetryPolicy("telegram", self.rate_limiter, self._classify_error)
 
         # Default continuation messages if not provided
-       
-       
-        self.continuation_end = continuation_notation or "⏳ ادامه در پیام بعدی..."
+        self.continuation_start = DEFAULT_CONTINUATION_START
+        self.continuation_end = continuation_notation or DEFAULT_CONTINUATION_END
+        self.splitter = TextSplitter(utf16_length, self.continuation_start, self.continuation_end)
 
-    def split_text(self, text, max_length):
+    async def start(self):
         """
-        Splits a given text into chunks, ensuring that words are not broken.
-        Adds continuation messages where necessary.
+        Initializes the bot's HTTP client once for a whole publish job.
         """
-        if len(text) <= max_length:
-            return [text]
+        await self.bot.initialize()
 
-        chunks = []
-        words = text.split(" ")
-        current_chunk = ""
+    async def close(self):
+        await self.bot.shutdown()
 
-        for word in words:
-            # If adding the next word exceeds the limit, finalize the current chunk
-            if len(current_chunk) + len(word) + 1 > max_length:
-                chunks.append(current_chunk.strip() + f"\n\n{self.continuation_end}")
-                current_chunk = f"{self.continuation_start}\n\n{word}"  # Start new chunk
-            else:
-                current_chunk += " " + word
+    async def __aenter__(self):
+        await self.start()
+        return self
 
-        # Add the last chunk
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
 
-        return chunks
+    def split_text(self, text, max_length):
+        """
+        Splits a given text into chunks, ensuring that words are not broken.
+        Adds continuation messages where necessary. Length is counted in
+        UTF-16 units, the way Telegram counts it.
+        """
+        return self.splitter.split(text, max_length)
 
-    async def send_message(self, text, photo_path=None):
+    async def send_message(self, text, photo_path=None, delivery=NO_JOURNAL):
         """
         Sends a message or a message with an image to the specified Telegram chat or channel.
-        Implements flood control handling.
+        Implements flood control handling. Parts already recorded in the
+        `delivery` journal are skipped. Returns False if a part could not be
+        sent.
         """
         try:
             if photo_path:
                 chunks = self.split_text(text, self.MAX_CAPTION_LENGTH)
-                with open(photo_path, 'rb') as photo:
-                    await self._safe_send_photo(photo, chunks[0])  # First chunk with the image
-                    for chunk in chunks[1:]:
-                        await self._safe_send_message(chunk)
+                await delivery.send(  # First chunk with the image
+                    "photo:0", lambda: self._send_file(photo_path, "photo", chunks[0]),
+                    chunks[0], lambda message_id: self._edit_caption(message_id, chunks[0]),
+                )
+                for index, chunk in enumerate(chunks[1:], start=1):
+                    await self._send_text_part(delivery, f"text:{index}", chunk)
             else:
                 chunks = self.split_text(text, self.MAX_MESSAGE_LENGTH)
-                for chunk in chunks:
-                    await self._safe_send_message(chunk)
+                for index, chunk in enumerate(chunks):
+                    await self._send_text_part(delivery, f"text:{index}", chunk)
+            return True
         except Exception as e:
             print(f"Error sending message: {e}")
+            return False
 
-    async def send_message_with_images(self, text, images):
+    async def send_message_with_images(self, text, images, delivery=NO_JOURNAL):
         """
         Sends all associated images with their text as a caption to Telegram.
-        If there are no images, only sends the text. Handles flood control.
+        Several images go out as albums of up to ten photos; an album that is
+        rejected is re-sent photo by photo. If there are no images, only
+        sends the text. Embedded documents and videos follow as their own
+        messages. Handles flood control. Parts already recorded in the
+        `delivery` journal are skipped, so an interrupted section resumes
+        where it stopped. Returns True only if every part was delivered.
         """
-        if not images:
-            await self.send_message(text)
+        photos, files = split_media(images)
+        delivered = True
+        if not photos:
+            delivered = await self.send_message(text, delivery=delivery)
         else:
-            for image in images:
-                with open(image, "rb") as img_file:
-                    try:
-                        chunks = self.split_text(text, self.MAX_CAPTION_LENGTH)
-                        await self._safe_send_photo(img_file, chunks[0])  # Send first chunk as caption
-                        for chunk in chunks[1:]:
-                            await self._safe_send_message(chunk)
-                        text = ""  # Clear caption after first image
-                    except Exception as e:
-                        print(f"Error sending image with caption: {e}")
+            chunks = self.split_text(text, self.MAX_CAPTION_LENGTH)
+            caption, remaining_chunks = chunks[0], chunks[1:]
+            for start in range(0, len(photos), self.MAX_MEDIA_GROUP_SIZE):
+                group = photos[start:start + self.MAX_MEDIA_GROUP_SIZE]
+                if not (len(group) > 1 and await self._send_media_group(group, caption, start, delivery)):
+                    if not await self._send_photos_one_by_one(group, caption, start, delivery):
+                        delivered = False
 
-    async def _safe_send_message(self, text):
+                try:
+                    for index, chunk in enumerate(remaining_chunks, start=1):
+                        await self._send_text_part(delivery, f"text:{index}", chunk)
+                except Exception as e:
+                    print(f"Error sending caption continuation: {e}")
+                    delivered = False
+                caption, remaining_chunks = "", []  # Caption only goes with the first album
+
+        for index, file in enumerate(files):
+            try:
+                await delivery.send(f"file:{index}", lambda: self._send_file(file, media_kind(file)))
+            except Exception as e:
+                print(f"Error sending {media_kind(file)} {file}: {e}")
+                delivered = False
+        return delivered
+
+    async def _send_media_group(self, images, caption, start=0, delivery=NO_JOURNAL):
         """
-        Sends a text message with flood control handling.
+        Sends the images as one album with the caption on the first photo.
+        Returns False if the album could not be sent.
+        """
+        part = f"album:{start}"
+        if delivery.is_sent(part) or await delivery.revise(
+            part, caption, lambda message_id: self._edit_caption(message_id, caption)
+        ):
+            return True
+        if any(delivery.was_sent(f"photo:{start + offset}") for offset in range(len(images))):
+            return False  # An earlier run fell back to single photos; finish those
+
+        content_hashes = []
+        claimed = set()
+        try:
+            content_hashes = [image_hash(image) for image in images]
+            # Waits for images other chats are uploading, claiming in hash order so albums never deadlock
+            file_ids = await self.file_id_cache.claim_many(self.cache_scope, content_hashes)
+            claimed.update(content_hash for content_hash, file_id in file_ids.items() if not file_id)
+            photos = [file_ids[content_hash] or as_image_blob(image) for content_hash, image in zip(content_hashes, images)]
+            messages = await self._safe_send_media_group(photos, caption)
+            delivery.record(part, messages, caption)
+            for content_hash, message in zip(content_hashes, messages):
+                self._remember_file_id(content_hash, message)
+            return True
+        except Exception as e:
+            print(f"Error sending media group, falling back to single photos: {e}")
+            for content_hash in content_hashes:
+                self.file_id_cache.forget(self.cache_scope, content_hash)  # Re-upload in the fallback
+            return False
+        finally:
+            for content_hash in claimed:
+                self.file_id_cache.release(self.cache_scope, content_hash)
+
+    async def _send_photos_one_by_one(self, images, caption, start=0, delivery=NO_JOURNAL):
+        """
+        Sends each image as its own photo, captioning only the first one.
+        Returns False if a photo could not be sent.
         """
-        while True:
+        delivered = True
+        for offset, image in enumerate(images):
             try:
-                await self.bot.send_message(chat_id=self.chat_id, text=text)
-                break  # Exit loop if successful
+                await delivery.send(
+                    f"photo:{start + offset}", lambda: self._send_file(image, "photo", caption),
+                    caption, lambda message_id: self._edit_caption(message_id, caption),
+                )
+                caption = ""  # Clear caption after first image
             except Exception as e:
-                if "Retry in" in str(e):
-                    retry_after = self._parse_retry_time(str(e))
-                    print(f"Flood control exceeded. Retrying in {retry_after} seconds...")
-                    await asyncio.sleep(retry_after)
-                else:
-                    raise e
+                print(f"Error sending image with caption: {e}")
+                delivered = False
+        return delivered
 
-    async def _safe_send_photo(self, photo, caption):
+    async def _send_file(self, image, kind, caption=None):
         """
-        Sends a photo with caption and handles flood control.
+        Sends one photo, video or document, by cached file_id when it has
+        been uploaded before. A file_id Telegram no longer accepts is dropped
+        and the file is uploaded again.
         """
-        while True:
+        claimed = set()
+        try:
+            content_hash, file = await self._file_input(image, claimed)
             try:
-                await self.bot.send_photo(chat_id=self.chat_id, photo=photo, caption=caption)
-                break  # Exit loop if successful
-            except Exception as e:
-                if "Retry in" in str(e):
-                    retry_after = self._parse_retry_time(str(e))
-                    print(f"Flood control exceeded. Retrying in {retry_after} seconds...")
-                    await asyncio.sleep(retry_after)
+                message = await self._safe_send_file(kind, file, caption)
+            except BadRequest as e:  # Not flood or network errors: the file_id is fine then
+                if not isinstance(file, str):
+                    raise
+                print(f"Cached file_id rejected, uploading {image} again: {e}")
+                self.file_id_cache.forget(self.cache_scope, content_hash)
+                message = await self._safe_send_file(kind, as_image_blob(image), caption)
+            self._remember_file_id(content_hash, message)
+            return message
+        finally:
+            for content_hash in claimed:
+                self.file_id_cache.release(self.cache_scope, content_hash)
+
+    async def _file_input(self, image, claimed):
+        """
+        Returns the file's content hash and what to send for it: the cached
+        file_id if there is one, otherwise the file as an ImageBlob, to be
+        streamed. When another chat is uploading the same
+        file, this waits for its file_id. A file this call has to upload is
+        added to `claimed`, for the caller to release.
+        """
+        content_hash = image_hash(image)
+        file_id = await self.file_id_cache.claim(self.cache_scope, content_hash)
+        if file_id:
+            return content_hash, file_id
+        claimed.add(content_hash)
+        return content_hash, as_image_blob(image)
+
+    def _remember_file_id(self, content_hash, message):
+        if message is None:
+            return
+        file = message.photo[-1] if message.photo else message.video or message.document
+        if file is not None:
+            self.file_id_cache.put(self.cache_scope, content_hash, file.file_id)
+
+    @contextlib.contextmanager
+    def _uploads(self, files, attach=False):
+        """
+        Yields what to hand python-telegram-bot for each file: file_ids as
+        they are, other files as InputFiles over a freshly opened stream,
+        which httpx uploads in chunks instead of reading the file into
+        memory. Opened for every attempt, so a retry starts from the top.
+        """
+        with contextlib.ExitStack() as stack:
+            inputs = []
+            for file in files:
+                if isinstance(file, str):
+                    inputs.append(file)
                 else:
-                    raise e
+                    stream = stack.enter_context(open_image(file))
+                    inputs.append(InputFile(stream, filename=image_filename(file), attach=attach, read_file_handle=False))
+            yield inputs
+
+    def _count_upload(self, files):
+        self.timings.count("bytes_uploaded", sum(image_size(file) for file in files if not isinstance(file, str)))
+
+    async def _send_text_part(self, delivery, part, text):
+        await delivery.send(
+            part, lambda: self._safe_send_message(text), text, lambda message_id: self._edit_text(message_id, text)
+        )
+
+    async def _edit_text(self, message_id, text):
+        """
+        Replaces the text of a message sent for an earlier revision.
+        """
+        return await self.retry_policy.call(
+            self.chat_id,
+            lambda: self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=message_id),
+            "telegram.editMessageText",
+        )
+
+    async def _edit_caption(self, message_id, caption):
+        """
+        Replaces the caption of a photo or album sent for an earlier revision.
+        """
+        return await self.retry_policy.call(
+            self.chat_id,
+            lambda: self.bot.edit_message_caption(chat_id=self.chat_id, message_id=message_id, caption=caption or None),
+            "telegram.editMessageCaption",
+        )
+
+    async def _safe_send_message(self, text):
+        """
+        Sends a text message with flood control handling.
+        Returns the sent message.
+        """
+        return await self.retry_policy.call(
+            self.chat_id, lambda: self.bot.send_message(chat_id=self.chat_id, text=text), "telegram.sendMessage"
+        )
+
+    async def _safe_send_file(self, kind, file, caption):
+        """
+        Sends a photo, video or document (a file_id or a file to upload)
+        with its caption and handles flood control.
+        Returns the sent message.
+        """
+        send = {"photo": self.bot.send_photo, "video": self.bot.send_video, "document": self.bot.send_document}[kind]
+
+        async def attempt():
+            with self._uploads([file]) as (upload,):
+                return await send(self.chat_id, upload, caption=caption or None)
+
+        result = await self.retry_policy.call(self.chat_id, attempt, f"telegram.send{kind.capitalize()}")
+        self._count_upload([file])
+        return result
+
+    async def _safe_send_media_group(self, photos, caption):
+        """
+        Sends an album, with the caption on the first photo, and handles
+        flood control. Returns the sent messages.
+        """
+        async def attempt():
+            with self._uploads(photos, attach=True) as uploads:
+                media = [
+                    InputMediaPhoto(upload, caption=caption if index == 0 and caption else None)
+                    for index, upload in enumerate(uploads)
+                ]
+                return await self.bot.send_media_group(chat_id=self.chat_id, media=media)
+
+        result = await self.retry_policy.call(self.chat_id, attempt, "telegram.sendMediaGroup")
+        self._count_upload(photos)
+        return result
 
-    def _parse_retry_time(self, error_message):
+    @staticmethod
+    def _classify_error(error):
         """
-        Extracts the retry time from the error message.
+        Tells the retry policy what to do about a failed call: wait out the
+        retry_after Telegram sent with a flood error, back off after a
+        network error, or give up.
         """
-        match = re.search(r"Retry in (\d+) seconds", error_message)
-        if match:
-            return int(match.group(1))
-        return 5  # Default to 5 seconds if parsing fails
\ No newline at end of file
+        if isinstance(error, RetryAfter):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # PTB 22 warns that the int form will become a timedelta
+                retry_after = error.retry_after
+            if isinstance(retry_after, datetime.timedelta):
+                retry_after = retry_after.total_seconds()
+            return FLOOD, float(retry_after)
+        if isinstance(error, NetworkError) and not isinstance(error, BadRequest):
+            return TRANSIENT, None  # Includes TimedOut; BadRequest is a NetworkError too but is final
+        return None
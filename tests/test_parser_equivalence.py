@@ -0,0 +1,207 @@
+"""
+FastDocxParser must return exactly what the reference DocxParser returns.
+Each test builds a small .docx around one construct and compares both
+parsers' sections. benchmarks/compare_parsers.py does the same on whole
+generated bulletins and times them.
+"""
+import io
+import struct
+import zipfile
+import zlib
+
+import pytest
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from docx.oxml import parse_xml
+
+from extract_content import DocxParser
+from extract_content_fast import FastDocxParser
+from image_blob import ImageBlob
+
+NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:o="urn:schemas-microsoft-com:office:office" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+)
+
+
+def make_png(seed):
+    """
+    Returns a valid 1x1 PNG whose colour depends on seed.
+    """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    pixel = bytes([0, seed % 256, (seed * 7) % 256, (seed * 13) % 256])
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(pixel)) + chunk(b"IEND", b""))
+
+
+def new_document():
+    """
+    Returns a document opened with a desk heading and a story heading, so
+    the paragraphs added next land in a section.
+    """
+    document = Document()
+    document.add_heading("دبیرخانه", level=1)
+    document.add_heading("خبر", level=4)
+    return document
+
+
+def embed_part(document, partname, content_type, blob, reltype):
+    part = Part(PackURI(partname), content_type, blob, document.part.package)
+    return document.part.relate_to(part, reltype)
+
+
+def describe(sections):
+    described = []
+    for section in sections:
+        images = [
+            (image.partname, image.content_type, image.content_hash) if isinstance(image, ImageBlob) else image
+            for image in section["images"]
+        ]
+        described.append((section["text"], images))
+    return described
+
+
+def repackage(path, renames, edits):
+    """
+    Rewrites the saved package with parts renamed and `edits` (old text ->
+    new text) applied to the relationships and [Content_Types].xml.
+    """
+    with zipfile.ZipFile(path) as package:
+        parts = {info.filename: package.read(info) for info in package.infolist()}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        for name, data in parts.items():
+            if name.endswith(".rels") or name == "[Content_Types].xml":
+                for old, new in edits.items():
+                    data = data.replace(old.encode(), new.encode())
+            package.writestr(renames.get(name, name), data)
+
+
+def parse_both(document, tmp_path, renames=None, edits=None):
+    """
+    Saves the document and returns (reference sections, fast sections),
+    asserting they are identical. Parts can be renamed or edited in the
+    saved package first.
+    """
+    path = str(tmp_path / "bulletin.docx")
+    document.save(path)
+    if renames or edits:
+        repackage(path, renames or {}, edits or {})
+    reference = describe(DocxParser(path, save_images=False).iter_sections())
+    fast = describe(FastDocxParser(path, save_images=False).iter_sections())
+    assert fast == reference
+    return reference
+
+
+def test_empty_headings(tmp_path):
+    document = new_document()
+    document.add_heading("", level=1)
+    document.add_heading(" ", level=4)
+    document.add_paragraph("متن")
+    document.add_heading("", level=4)
+    document.add_paragraph("")
+    assert parse_both(document, tmp_path)
+
+
+def test_tables_are_skipped(tmp_path):
+    document = new_document()
+    document.add_paragraph("قبل از جدول")
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "جدول"
+    table.cell(1, 1).add_paragraph().add_run().add_picture(io.BytesIO(make_png(1)))
+    document.add_paragraph("بعد از جدول")
+    sections = parse_both(document, tmp_path)
+    assert "جدول" not in sections[-1][0].replace("قبل از جدول", "").replace("بعد از جدول", "")
+    assert sections[-1][1] == []
+
+
+def test_hyperlinks(tmp_path):
+    document = new_document()
+    paragraph = document.add_paragraph("پیش از پیوند ")
+    rel_id = document.part.relate_to("https://example.com", RT.HYPERLINK, is_external=True)
+    paragraph._p.append(parse_xml(
+        f'<w:hyperlink {NAMESPACES} r:id="{rel_id}"><w:r><w:t xml:space="preserve">پیوند </w:t></w:r>'
+        f'<w:r><w:t>دوم</w:t></w:r></w:hyperlink>'
+    ))
+    paragraph.add_run(" پس از پیوند")
+    assert "پیوند دوم" in parse_both(document, tmp_path)[-1][0]
+
+
+def test_breaks_and_special_characters(tmp_path):
+    document = new_document()
+    paragraph = document.add_paragraph("ستون\tدوم")
+    paragraph.add_run("خط").add_break()
+    paragraph.add_run("صفحه").add_break(WD_BREAK.PAGE)
+    paragraph.add_run("ستون").add_break(WD_BREAK.COLUMN)
+    paragraph.add_run()._r.append(parse_xml(f"<w:cr {NAMESPACES}/>"))
+    paragraph.add_run()._r.append(parse_xml(f"<w:noBreakHyphen {NAMESPACES}/>"))
+    paragraph.add_run()._r.append(parse_xml(f"<w:ptab {NAMESPACES} w:relativeTo=\"margin\" w:alignment=\"left\" w:leader=\"none\"/>"))
+    paragraph.add_run("پایان")
+    assert parse_both(document, tmp_path)
+
+
+def test_repeated_images(tmp_path):
+    document = new_document()
+    for seed in (1, 2, 1):
+        document.add_paragraph().add_run().add_picture(io.BytesIO(make_png(seed)))
+    images = parse_both(document, tmp_path)[-1][1]
+    assert len(images) == 3 and images[0] == images[2] != images[1]
+
+
+def test_linked_images_are_skipped(tmp_path):
+    document = new_document()
+    document.add_paragraph().add_run().add_picture(io.BytesIO(make_png(1)))
+    rel_id = document.part.relate_to("https://example.com/photo.png", RT.IMAGE, is_external=True)
+    document.add_paragraph("عکس پیوندی").add_run()._r.append(parse_xml(
+        f'<w:drawing {NAMESPACES}><a:blip r:link="{rel_id}"/></w:drawing>'
+    ))
+    assert len(parse_both(document, tmp_path)[-1][1]) == 1
+
+
+def test_content_types_ignore_case(tmp_path):
+    document = new_document()
+    for seed in (1, 2):
+        document.add_paragraph().add_run().add_picture(io.BytesIO(make_png(seed)))
+    # image1 falls back to the png default; image2 has an override whose part name differs in case
+    renames = {"word/media/image1.png": "word/media/image1.PNG"}
+    edits = {
+        "media/image1.png": "media/image1.PNG",
+        'Extension="png"': 'Extension="Png"',
+        "</Types>": '<Override PartName="/WORD/MEDIA/IMAGE2.PNG" ContentType="image/x-png"/></Types>',
+    }
+    images = parse_both(document, tmp_path, renames, edits)[-1][1]
+    assert [image[:2] for image in images] == [("/word/media/image1.PNG", "image/png"), ("/word/media/image2.png", "image/x-png")]
+
+
+def test_embedded_files(tmp_path):
+    document = new_document()
+    package = embed_part(document, "/word/embeddings/Microsoft_Word_Document1.docx",
+                         "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                         b"PK embedded", RT.PACKAGE)
+    binary = embed_part(document, "/word/embeddings/oleObject1.bin",
+                        "application/vnd.openxmlformats-officedocument.oleObject", b"OLE binary", RT.OLE_OBJECT)
+    video = embed_part(document, "/word/media/video1.mp4", "video/mp4", b"video", RT.VIDEO)
+    for rel_id in (package, binary):
+        document.add_paragraph("پیوست").add_run()._r.append(parse_xml(
+            f'<w:object {NAMESPACES}><o:OLEObject Type="Embed" ProgID="Word.Document.12" r:id="{rel_id}"/></w:object>'
+        ))
+    document.add_paragraph("ویدیو").add_run()._r.append(parse_xml(
+        f'<w:drawing {NAMESPACES}><a:videoFile r:link="{video}"/></w:drawing>'
+    ))
+    partnames = [image[0] for image in parse_both(document, tmp_path)[-1][1]]
+    assert partnames == ["/word/embeddings/Microsoft_Word_Document1.docx", "/word/media/video1.mp4"]
+
+
+@pytest.mark.parametrize("style_id", ["NoSuchStyle", "heading4"])
+def test_unknown_style_ids(tmp_path, style_id):
+    document = new_document()
+    paragraph = document.add_paragraph("سبک ناشناخته")
+    paragraph._p.get_or_add_pPr().append(parse_xml(f'<w:pStyle {NAMESPACES} w:val="{style_id}"/>'))
+    document.add_paragraph("بعدی")
+    assert parse_both(document, tmp_path)
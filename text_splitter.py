@@ -0,0 +1,124 @@
+import unicodedata
+
+DEFAULT_CONTINUATION_START = "🔄 این پیام ادامه‌ی پیام قبلی است..."
+DEFAULT_CONTINUATION_END = "⏳ ادامه در پیام بعدی..."
+
+# Places to break a long text, best first: paragraphs, lines, sentences, words
+PARAGRAPH_BREAKS = ("\n\n",)
+LINE_BREAKS = ("\n",)
+SENTENCE_BREAKS = (". ", "! ", "? ", "؟ ", "۔ ", "… ")
+WORD_BREAKS = (" ", "\t")
+
+# Characters that belong to the previous character's grapheme; never cut before them
+JOINERS = {"‌", "‍"}  # ZWNJ (common in Persian words) and ZWJ (emoji sequences)
+
+
+def utf16_length(text):
+    """
+    Length as Telegram counts it: UTF-16 code units, so most emoji count as 2.
+    """
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _is_grapheme_extender(char):
+    code = ord(char)
+    return (
+        unicodedata.category(char) in ("Mn", "Mc", "Me")
+        or char in JOINERS
+        or 0xFE00 <= code <= 0xFE0F  # Variation selectors
+        or 0x1F3FB <= code <= 0x1F3FF  # Skin tone modifiers
+        or 0xE0020 <= code <= 0xE007F  # Tag characters (flag sequences)
+    )
+
+
+class TextSplitter:
+    """
+    Splits long text into message-sized chunks in a single pass.
+
+    Chunks break at the best boundary in the second half of the allowed
+    window (paragraph, then line, sentence and word), and only cut inside a
+    word when there is no boundary at all, never in the middle of a
+    grapheme. Length is measured with the platform's own `length` function,
+    and the continuation markers are counted against the limit.
+    """
+
+    def __init__(self, length=len, continuation_start=DEFAULT_CONTINUATION_START,
+                 continuation_end=DEFAULT_CONTINUATION_END):
+        self.length = length
+        self.start_marker = f"{continuation_start}\n\n" if continuation_start else ""
+        self.end_marker = f"\n\n{continuation_end}" if continuation_end else ""
+
+    def split(self, text, max_length):
+        """
+        Returns the chunks of `text`, each at most `max_length` units long
+        including the continuation markers.
+        """
+        if self.length(text) <= max_length:
+            return [text]
+        text = text.strip()
+
+        start_units = self.length(self.start_marker)
+        end_units = self.length(self.end_marker)
+        if max_length - start_units - end_units <= 0:
+            raise ValueError("max_length is too small for the continuation markers")
+
+        chunks = []
+        position = 0
+        while position < len(text):
+            prefix = self.start_marker if chunks else ""
+            budget = max_length - (start_units if chunks else 0)
+
+            # The rest fits: this is the last chunk and needs no end marker
+            end, fits = self._fit(text, position, budget)
+            if fits:
+                chunks.append(prefix + text[position:].strip())
+                break
+
+            end, _ = self._fit(text, position, budget - end_units)
+            end = max(end, position + 1)  # Always make progress
+            cut, next_position = self._find_break(text, position, end)
+            chunks.append(prefix + text[position:cut].strip() + self.end_marker)
+
+            position = next_position
+            while position < len(text) and text[position].isspace():
+                position += 1
+
+        return chunks
+
+    def _fit(self, text, position, budget):
+        """
+        Returns the largest end index so text[position:end] fits in `budget`
+        units, and whether that reaches the end of the text. Every character
+        costs one or two units, so a few shrinking steps find the end.
+        """
+        end = min(len(text), position + budget)
+        units = self.length(text[position:end])
+        while units > budget:
+            end -= max(1, (units - budget + 1) // 2)
+            units = self.length(text[position:end])
+        return end, end == len(text)
+
+    def _find_break(self, text, position, end):
+        """
+        Picks where to end the chunk text[position:end]. Returns the cut index
+        and the index the next chunk starts from.
+        """
+        # Only accept boundaries in the second half of the window, so every
+        # chunk is at least half full and the whole split stays linear.
+        lower = position + (end - position) // 2
+        for separators in (PARAGRAPH_BREAKS, LINE_BREAKS, SENTENCE_BREAKS, WORD_BREAKS):
+            best = -1
+            best_separator = ""
+            for separator in separators:
+                index = text.rfind(separator, lower, end)
+                if index > best:
+                    best, best_separator = index, separator
+            if best > position:
+                cut = best + len(best_separator.rstrip())  # Keep the sentence punctuation
+                return cut, best + len(best_separator)
+
+        # No boundary at all: cut inside the word, but not inside a grapheme
+        cut = end
+        while cut > position + 1 and (_is_grapheme_extender(text[cut]) or text[cut - 1] in JOINERS):
+            cut -= 1
+        return cut, cut
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import shutil
+import time
+from parse_cache import ParseCache
+from send_journal import SendJournal
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # inotify_simple is optional and Linux-only; fall back to polling
+    INotify = None
+
+
+class InboxWatcher:
+    """
+    Daemon mode: watches an inbox directory and publishes every .docx that
+    lands in it. Bot sessions, rate limiters and the file_id cache stay warm
+    between documents. Published documents are moved to inbox/processed and
+    documents that fail to open to inbox/failed.
+    """
+
+    def __init__(self, inbox_dir, publisher, save_images=False, optimizer=None,
+                 poll_interval=5.0, settle_interval=1.0):
+        self.inbox_dir = os.path.abspath(inbox_dir)
+        self.processed_dir = os.path.join(self.inbox_dir, "processed")
+        self.failed_dir = os.path.join(self.inbox_dir, "failed")
+        self.publisher = publisher
+        self.save_images = save_images
+        self.optimizer = optimizer
+        self.poll_interval = poll_interval
+        self.settle_interval = settle_interval  # A file must stay unchanged this long before it is read
+        self.parse_cache = ParseCache()
+        self._pending = {}  # Path -> (size, mtime) from the previous scan
+        self._inotify = None
+
+    async def run(self):
+        """
+        Watches the inbox until cancelled (Ctrl+C).
+        """
+        for directory in (self.inbox_dir, self.processed_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        if INotify is not None:
+            self._inotify = INotify()
+            self._inotify.add_watch(self.inbox_dir, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+            print(f"Watching {self.inbox_dir} for new documents (inotify)...")
+        else:
+            print(f"Watching {self.inbox_dir} for new documents (polling every {self.poll_interval}s)...")
+
+        try:
+            async with self.publisher:
+                while True:
+                    for path in self._ready_documents():
+                        await self.publish_document(path)
+                    await self._wait_for_changes()
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+
+    async def publish_document(self, path):
+        print(f"New document: {path}")
+        started = time.monotonic()
+        try:
+            document_id = await asyncio.to_thread(SendJournal.document_id, path)  # A re-dropped document resumes, never re-posts
+            sections = await asyncio.to_thread(self.parse_cache.iter_sections, path, self.save_images, None, document_id)
+        except Exception as e:
+            print(f"Error extracting content from {path}: {e}")
+            self._move(path, self.failed_dir)
+            return
+
+        if self.optimizer:
+            sections = self.optimizer.optimize_sections(sections)
+        results = await self.publisher.publish(sections, document_id, os.path.basename(path))
+        print(f"Published {os.path.basename(path)} in {time.monotonic() - started:.1f}s: {results}")
+        self._move(path, self.processed_dir)
+
+    def _ready_documents(self):
+        """
+        Returns the .docx files whose size and modification time did not
+        change since the previous scan, so half-copied files are left alone.
+        """
+        ready = []
+        current = {}
+        for entry in os.scandir(self.inbox_dir):
+            name = entry.name
+            if not entry.is_file() or not name.lower().endswith(".docx") or name.startswith("~$"):
+                continue  # "~$" files are Word's lock files
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._pending.get(entry.path) == signature:
+                ready.append(entry.path)
+            else:
+                current[entry.path] = signature
+        self._pending = current
+        return sorted(ready)
+
+    async def _wait_for_changes(self):
+        if self._pending:
+            await asyncio.sleep(self.settle_interval)  # Re-check files that are still being written
+        elif self._inotify is not None:
+            # Wakes up as soon as something lands in the inbox
+            await asyncio.to_thread(self._inotify.read, int(self.poll_interval * 1000))
+        else:
+            await asyncio.sleep(self.poll_interval)
+
+    def _move(self, path, directory):
+        target = os.path.join(directory, os.path.basename(path))
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(os.path.basename(path))
+            target = os.path.join(directory, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}{ext}")
+        shutil.move(path, target)